@@ -0,0 +1,47 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Reruns allowed to load and draw at the same time across all sessions, and how long a rerun queues for
+# a slot before the session is told the dashboard is busy
+MAX_ACTIVE_RERUNS = int(os.environ.get('SUSTAINABILITY_MAX_ACTIVE_RERUNS', '8'))
+ADMISSION_TIMEOUT_SECONDS = 15
+
+
+class Overloaded(Exception):
+    pass
+
+
+_slots = threading.BoundedSemaphore(MAX_ACTIVE_RERUNS)
+# session_id -> [lock, reruns holding or waiting for it]; dropped once nobody uses it
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+@contextmanager
+def admit(session_id, timeout=ADMISSION_TIMEOUT_SECONDS):
+    # A session holds at most one slot: a rerun that supersedes one still unwinding waits for it rather than
+    # taking a second slot, so one impatient user can't crowd out the others
+    deadline = time.monotonic() + timeout
+    with _sessions_lock:
+        session = _sessions.setdefault(session_id, [threading.Lock(), 0])
+        session[1] += 1
+    try:
+        if not session[0].acquire(timeout=timeout):
+            raise Overloaded(f'session {session_id} still has a rerun in progress')
+        try:
+            if not _slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise Overloaded(f'{MAX_ACTIVE_RERUNS} reruns already in progress')
+            try:
+                yield
+            finally:
+                _slots.release()
+        finally:
+            session[0].release()
+    finally:
+        with _sessions_lock:
+            session[1] -= 1
+            if session[1] == 0:
+                del _sessions[session_id]
@@ -0,0 +1,183 @@
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_access
+import migrations
+
+
+# Power readings are compared with baseline_performance.avg_power_kw, scaled by the asset's recent noise
+ROLLING_WINDOW = 12
+MIN_READINGS = 4
+Z_THRESHOLD = 3.0
+# Floor for the noise estimate so a perfectly steady asset doesn't divide by zero
+MIN_NOISE_FRACTION = 0.05
+# Consecutive out-of-band readings needed before an alert is raised
+SUSTAINED_READINGS = 3
+
+# Batches running this much longer than avg_runtime_min raise a runtime alert
+RUNTIME_TOLERANCE = 0.25
+
+ENERGY_STATE = 'alert_engine.energy_usage'
+BATCH_STATE = 'alert_engine.batches'
+EVALUATION_CHUNK_ROWS = 500_000
+
+
+def _context_readings(conn, asset_ids, high_water_mark):
+    # Trailing readings already evaluated, so rolling windows and runs continue across cycles.
+    # One indexed seek per asset; plain cursors keep this cheap for thousands of assets
+    rows = []
+    for asset_id in asset_ids:
+        rows += conn.execute(
+            'SELECT usage_id, asset_id, timestamp, power_kw FROM energy_usage '
+            'WHERE asset_id = ? AND usage_id <= ? ORDER BY timestamp DESC LIMIT ?',
+            (int(asset_id), high_water_mark, ROLLING_WINDOW + SUSTAINED_READINGS)).fetchall()
+    return pd.DataFrame(rows, columns=['usage_id', 'asset_id', 'timestamp', 'power_kw'])
+
+
+def power_deviation_alerts(readings, baselines):
+    # One vectorized pass over every asset: rolling z-score against the baseline, then run lengths
+    readings = readings.merge(baselines[['asset_id', 'avg_power_kw']], on='asset_id', how='inner')
+    readings = readings.sort_values(['asset_id', 'timestamp'], kind='stable').reset_index(drop=True)
+    by_asset = readings.groupby('asset_id', sort=False)['power_kw']
+
+    # Noise comes from the window that ends just before a candidate run, so the run can't mask itself
+    rolling_std = by_asset.rolling(ROLLING_WINDOW, min_periods=MIN_READINGS).std().reset_index(level=0, drop=True)
+    rolling_std = rolling_std.groupby(readings['asset_id']).shift(SUSTAINED_READINGS)
+    noise = np.maximum(rolling_std, readings['avg_power_kw'].abs() * MIN_NOISE_FRACTION)
+    readings['z'] = (readings['power_kw'] - readings['avg_power_kw']) / noise
+
+    alerts = []
+    for alert_type, direction in (('Above Baseline', 1), ('Below Baseline', -1)):
+        outside = (readings['z'] * direction > Z_THRESHOLD).to_numpy()
+
+        # Run length of consecutive out-of-band readings, restarting at every asset boundary
+        new_asset = (readings['asset_id'] != readings['asset_id'].shift()).to_numpy()
+        run_start = new_asset | np.r_[True, outside[1:] != outside[:-1]]
+        run_id = np.cumsum(run_start)
+        run_length = pd.Series(outside.astype(np.int64)).groupby(run_id).cumsum().to_numpy()
+        confirmed = outside & (run_length == SUSTAINED_READINGS)
+        if not confirmed.any():
+            continue
+
+        # Report the mean power over the sustained window against the z-threshold power level
+        window_mean = by_asset.rolling(SUSTAINED_READINGS).mean().reset_index(level=0, drop=True)
+        hit = readings[confirmed]
+        alerts.append(pd.DataFrame({
+            'usage_id': hit['usage_id'],
+            'asset_id': hit['asset_id'],
+            'timestamp': hit['timestamp'],
+            'alert_type': alert_type,
+            'value': window_mean[confirmed].round(2),
+            'threshold': (hit['avg_power_kw'] + direction * Z_THRESHOLD * noise[confirmed]).round(2),
+        }))
+
+    if not alerts:
+        return pd.DataFrame(columns=['usage_id', 'asset_id', 'timestamp', 'alert_type', 'value', 'threshold'])
+    return pd.concat(alerts, ignore_index=True)
+
+
+def runtime_overrun_alerts(batches, baselines):
+    batches = batches.merge(baselines[['asset_id', 'avg_runtime_min']], on='asset_id', how='inner')
+    runtime = (pd.to_datetime(batches['end_time']) - pd.to_datetime(batches['start_time'])).dt.total_seconds() / 60
+    limit = batches['avg_runtime_min'] * (1 + RUNTIME_TOLERANCE)
+    over = runtime > limit
+    return pd.DataFrame({
+        'asset_id': batches.loc[over, 'asset_id'],
+        'timestamp': batches.loc[over, 'end_time'],
+        'alert_type': 'Runtime Overrun',
+        'value': runtime[over].round(2),
+        'threshold': limit[over].round(2),
+    })
+
+
+def _insert_alerts(conn, alerts):
+    conn.executemany(
+        'INSERT INTO alerts (asset_id, timestamp, alert_type, value, threshold) VALUES (?, ?, ?, ?, ?)',
+        alerts[['asset_id', 'timestamp', 'alert_type', 'value', 'threshold']].astype(object).itertuples(index=False, name=None))
+
+
+def _evaluate_energy(conn, baselines):
+    high_water_mark = data_access.get_watermark(conn, ENERGY_STATE)
+    new = pd.read_sql_query(
+        'SELECT usage_id, asset_id, timestamp, power_kw FROM energy_usage '
+        'WHERE usage_id > ? ORDER BY usage_id LIMIT ?',
+        conn, params=(high_water_mark, EVALUATION_CHUNK_ROWS))
+    if new.empty:
+        return 0, 0
+
+    context = _context_readings(conn, new['asset_id'].unique(), high_water_mark)
+    alerts = power_deviation_alerts(pd.concat([context, new], ignore_index=True), baselines)
+    # Alerts confirmed inside the context were already raised by an earlier cycle
+    alerts = alerts[alerts['usage_id'] > high_water_mark]
+
+    _insert_alerts(conn, alerts)
+    data_access.set_watermark(conn, ENERGY_STATE, int(new['usage_id'].max()))
+    return len(new), len(alerts)
+
+
+def _evaluate_batches(conn, baselines):
+    high_water_mark = data_access.get_watermark(conn, BATCH_STATE)
+    new = pd.read_sql_query(
+        'SELECT batch_id, asset_id, start_time, end_time FROM batches WHERE batch_id > ? ORDER BY batch_id',
+        conn, params=(high_water_mark,))
+    if new.empty:
+        return 0, 0
+
+    alerts = runtime_overrun_alerts(new, baselines)
+    _insert_alerts(conn, alerts)
+    data_access.set_watermark(conn, BATCH_STATE, int(new['batch_id'].max()))
+    return len(new), len(alerts)
+
+
+def evaluate(db_path=None):
+    # One evaluation cycle over everything that arrived since the last one
+    db_path = db_path or data_access.DB_PATH
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        baselines = pd.read_sql_query('SELECT asset_id, avg_power_kw, avg_runtime_min FROM baseline_performance', conn)
+        stats = {'readings': 0, 'batches': 0, 'alerts': 0}
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                readings, raised = _evaluate_energy(conn, baselines)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            stats['readings'] += readings
+            stats['alerts'] += raised
+            if readings < EVALUATION_CHUNK_ROWS:
+                break
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            stats['batches'], raised = _evaluate_batches(conn, baselines)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        stats['alerts'] += raised
+        return stats
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluate new readings and batches against baseline_performance.')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--every', type=float, help='keep evaluating every N seconds instead of running once')
+    args = parser.parse_args()
+
+    migrations.migrate(args.db)
+    while True:
+        started = time.perf_counter()
+        stats = evaluate(args.db)
+        print(f"Evaluated {stats['readings']} readings and {stats['batches']} batches, "
+              f"raised {stats['alerts']} alerts in {time.perf_counter() - started:.2f}s")
+        if args.every is None:
+            break
+        time.sleep(args.every)
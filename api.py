@@ -0,0 +1,325 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlsplit
+
+import pandas as pd
+
+import admission
+import asset_registry
+import billing
+import data_access
+import downsample
+import migrations
+import rollups
+
+
+# Read-only JSON over the loaders the dashboard uses, so API reads share their query cache and archive union.
+# Every list endpoint is paginated; energy can also be served from the rollups and thinned to max_points per asset.
+#   GET /sites
+#   GET /sites/<site>/{energy,alerts,batches}
+#   GET /assets/<asset_id>/{energy,alerts,batches}
+#   GET /billing
+DEFAULT_PORT = 8502
+DEFAULT_PAGE_ROWS = 1000
+MAX_PAGE_ROWS = 50_000
+# format=ndjson streams the whole selection with chunked encoding instead of paging through it
+STREAM_CHUNK_ROWS = 10_000
+# Smaller bodies aren't worth the CPU to gzip
+GZIP_MIN_BYTES = 1024
+# At most one incremental rollup pass this often, like the dashboard's
+ROLLUP_REFRESH_SECONDS = 60
+RESOLUTIONS = ['auto', 'raw', *rollups.LEVELS]
+DOWNSAMPLE_METHODS = ['lttb', 'minmax']
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+_rollups_refreshed = 0.0
+_rollups_lock = threading.Lock()
+
+
+def refresh_rollups():
+    global _rollups_refreshed
+    with _rollups_lock:
+        if time.monotonic() - _rollups_refreshed >= ROLLUP_REFRESH_SECONDS:
+            data_access.fan_out(rollups.refresh)
+            _rollups_refreshed = time.monotonic()
+
+
+def _one(query, name):
+    values = query.get(name)
+    return values[-1] if values else None
+
+
+def _timestamp(query, name):
+    value = _one(query, name)
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise ApiError(400, f'{name} must be an ISO date or timestamp, got {value!r}')
+
+
+def _integer(query, name, default, low, high):
+    value = _one(query, name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f'{name} must be an integer, got {value!r}')
+    if not low <= value <= high:
+        raise ApiError(400, f'{name} must be between {low} and {high}')
+    return value
+
+
+def _choice(query, name, choices):
+    value = _one(query, name) or choices[0]
+    if value not in choices:
+        raise ApiError(400, f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def _scope(kind, key):
+    # (asset_id, site) of a /assets/<id> or /sites/<site> path, checked against the registry
+    registry = asset_registry.load_registry()
+    if kind == 'assets':
+        if not key.isdigit() or int(key) not in registry.names:
+            raise ApiError(404, f'unknown asset {key!r}')
+        return int(key), None
+    if key not in registry.sites:
+        raise ApiError(404, f'unknown site {key!r}')
+    return None, key
+
+
+def _thin(frame, max_points, method):
+    # Downsampled per asset on power_kw, keeping whole rows so every metric of a kept reading comes along
+    if max_points is None or frame.empty:
+        return frame
+    kept = [downsample.downsample(readings, 'timestamp', 'power_kw', max_points, method).index
+            for _, readings in frame.groupby('asset_id', sort=False)]
+    return frame.loc[[row for rows in kept for row in rows]]
+
+
+def energy(query, asset_id, site):
+    start, end = _timestamp(query, 'start'), _timestamp(query, 'end')
+    resolution = _choice(query, 'resolution', RESOLUTIONS)
+    max_points = _integer(query, 'max_points', None, 3, MAX_PAGE_ROWS)
+    method = _choice(query, 'method', DOWNSAMPLE_METHODS)
+
+    if resolution == 'auto':
+        # The dashboard's rule: the coarsest rollup that still spreads enough buckets across the range
+        cover = rollups.coverage(asset_id=asset_id, site=site)
+        resolution = rollups.choose_resolution(start or cover['first'], end or cover['latest'], cover=cover)
+    if resolution == 'raw':
+        if asset_id is not None:
+            frame = data_access.load_energy_usage(asset_id, start=start, end=end)
+        else:
+            frame = data_access.load_site_energy_usage(site, start=start, end=end)
+    else:
+        refresh_rollups()
+        frame = rollups.load_energy_rollup(resolution, asset_id=asset_id, site=site, start=start, end=end)
+    return _thin(frame, max_points, method), {'resolution': resolution}
+
+
+def alerts(query, asset_id, site):
+    start, end = _timestamp(query, 'start'), _timestamp(query, 'end')
+    if asset_id is not None:
+        return data_access.load_alerts(asset_id, start=start, end=end), {}
+    return data_access.load_site_alerts(site, start=start, end=end), {}
+
+
+def batches(query, asset_id, site):
+    # Filtered on start_time after the load: batch tables are small next to energy_usage
+    start, end = _timestamp(query, 'start'), _timestamp(query, 'end')
+    frame = data_access.load_batches(asset_id) if asset_id is not None else data_access.load_site_batches(site)
+    if start is not None:
+        frame = frame[frame['start_time'] >= start]
+    if end is not None:
+        frame = frame[frame['start_time'] <= end]
+    return frame, {}
+
+
+def bills(query):
+    sites = query.get('site')
+    registry = asset_registry.load_registry()
+    for site in sites or []:
+        if site not in registry.sites:
+            raise ApiError(404, f'unknown site {site!r}')
+    return billing.load_bills(sites, _timestamp(query, 'start'), _timestamp(query, 'end')), {}
+
+
+def sites(query):
+    registry = asset_registry.load_registry()
+    frame = pd.DataFrame([{'site': site, 'asset_id': asset_id, 'name': registry.name_of(asset_id)}
+                          for site, asset_ids in registry.sites.items() for asset_id in asset_ids],
+                         columns=['site', 'asset_id', 'name'])
+    return frame, {}
+
+
+SCOPED = {'energy': energy, 'alerts': alerts, 'batches': batches}
+ROUTES = [
+    (re.compile(r'/(assets|sites)/([^/]+)/(energy|alerts|batches)'),
+     lambda query, kind, key, dataset: SCOPED[dataset](query, *_scope(kind, unquote(key)))),
+    (re.compile(r'/billing'), bills),
+    (re.compile(r'/sites'), sites),
+]
+
+
+def records(frame):
+    # Timestamps as ISO seconds, missing values as null, floats at the precision they are stored with
+    return data_access.exported(frame).to_json(orient='records', date_format='iso', date_unit='s')
+
+
+def etag(path, query):
+    # Derived from the request and the database files, not the body, so an unchanged resource is answered
+    # with 304 before anything is queried
+    signatures = [data_access.db_signature(db_path) for db_path in data_access.databases()]
+    state = json.dumps([path, sorted(query.items()), signatures])
+    return f'W/"{hashlib.sha1(state.encode()).hexdigest()}"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'SustainabilityAPI/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def send_response(self, code, message=None):
+        # Once a status line is out, a failure can no longer be answered with an error response
+        self.responded = True
+        super().send_response(code, message)
+
+    def do_GET(self):
+        self.responded = False
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        tag = etag(url.path, query)
+        if tag in (part.strip() for part in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(304)
+            self.send_header('ETag', tag)
+            self.end_headers()
+            return
+
+        try:
+            for pattern, handler in ROUTES:
+                match = pattern.fullmatch(url.path.rstrip('/'))
+                if match:
+                    break
+            else:
+                raise ApiError(404, f'no such resource {url.path!r}')
+            # Integrations get the same gate as dashboard reruns, one slot per client address
+            with admission.admit(f'api:{self.client_address[0]}'):
+                frame, meta = handler(query, *match.groups())
+                if _one(query, 'format') == 'ndjson':
+                    self.stream(frame, tag)
+                else:
+                    self.page(url.path, query, frame, meta, tag)
+        except ApiError as exc:
+            self.error(exc.status, str(exc))
+        except admission.Overloaded as exc:
+            self.error(503, str(exc), {'Retry-After': '5'})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; there is nobody left to answer
+            self.close_connection = True
+        except Exception as exc:
+            self.log_error('GET %s failed: %s: %s', self.path, type(exc).__name__, exc)
+            traceback.print_exc()
+            if self.responded:
+                # Mid-body: dropping the connection is the only way left to tell the client
+                self.close_connection = True
+            else:
+                self.error(500, 'internal error')
+
+    def page(self, path, query, frame, meta, tag):
+        limit = _integer(query, 'limit', DEFAULT_PAGE_ROWS, 1, MAX_PAGE_ROWS)
+        offset = _integer(query, 'offset', 0, 0, sys.maxsize)
+        following = None
+        if offset + limit < len(frame):
+            following = f"{quote(path)}?{urlencode({**query, 'offset': [offset + limit]}, doseq=True)}"
+        meta = {**meta, 'total': len(frame), 'offset': offset, 'limit': limit, 'next': following}
+        body = f'{{"meta": {json.dumps(meta)}, "data": {records(frame.iloc[offset:offset + limit])}}}'
+        self.send(200, body.encode(), tag)
+
+    def stream(self, frame, tag):
+        # One JSON object per line, encoded and compressed a chunk at a time so neither the response nor its
+        # gzipped copy is ever held whole
+        compressor = zlib.compressobj(wbits=31) if self.accepts_gzip() else None
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('ETag', tag)
+        self.send_header('Cache-Control', 'no-cache')
+        if compressor is not None:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        for offset in range(0, len(frame), STREAM_CHUNK_ROWS):
+            chunk = data_access.exported(frame.iloc[offset:offset + STREAM_CHUNK_ROWS])
+            data = (chunk.to_json(orient='records', lines=True, date_format='iso', date_unit='s') + '\n').encode()
+            self.write_chunk(compressor.compress(data) if compressor is not None else data)
+        if compressor is not None:
+            self.write_chunk(compressor.flush())
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, data):
+        if data:
+            self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+    def accepts_gzip(self):
+        return 'gzip' in self.headers.get('Accept-Encoding', '')
+
+    def send(self, status, body, tag=None, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if len(body) >= GZIP_MIN_BYTES and self.accepts_gzip():
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        if tag is not None:
+            self.send_header('ETag', tag)
+            self.send_header('Cache-Control', 'no-cache')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def error(self, status, message, headers=None):
+        self.send(status, json.dumps({'error': message}).encode(), headers=headers)
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT):
+    # Serves whatever data_access reads: data_access.DB_PATH, or every shard named by SUSTAINABILITY_SHARDS
+    for db_path in data_access.databases():
+        migrations.migrate(db_path)
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving {', '.join(map(os.path.abspath, data_access.databases()))} on http://{host}:{server.server_port}",
+          flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the dashboard's datasets as a read-only JSON API.")
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    data_access.DB_PATH = args.db
+    serve(args.host, args.port)
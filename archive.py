@@ -0,0 +1,151 @@
+import os
+import threading
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+
+# Cold history lives next to its database as Parquet, one file per table, site and month:
+#   <db>_archive/<table>/site=<site>/month=<YYYY-MM>/part-0.parquet
+# Files are sorted by asset_id then timestamp, so row-group statistics let a reader skip other assets
+TABLE_SCHEMAS = {
+    'energy_usage': pa.schema([
+        ('usage_id', pa.int64()),
+        ('asset_id', pa.int64()),
+        ('timestamp', pa.timestamp('s')),
+        ('power_kw', pa.float64()),
+        ('voltage', pa.float64()),
+        ('amperage', pa.float64()),
+    ]),
+    'alerts': pa.schema([
+        ('alert_id', pa.int64()),
+        ('asset_id', pa.int64()),
+        ('timestamp', pa.timestamp('s')),
+        ('alert_type', pa.string()),
+        ('value', pa.float64()),
+        ('threshold', pa.float64()),
+    ]),
+}
+PARTITIONING = ds.partitioning(pa.schema([('site', pa.string()), ('month', pa.string())]), flavor='hive')
+ROW_GROUP_ROWS = 64 * 1024
+VERSION_FILE = '_version'
+
+
+def archive_dir(db_path):
+    return os.path.splitext(os.path.abspath(db_path))[0] + '_archive'
+
+
+def id_column(table):
+    return TABLE_SCHEMAS[table].names[0]
+
+
+def partition_path(root, table, site, month):
+    # Hive-style directories; pyarrow decodes the percent-encoding when it discovers them
+    return os.path.join(root, table, f"site={quote(site, safe='')}", f'month={month}', 'part-0.parquet')
+
+
+def _version(root, table):
+    try:
+        return os.stat(os.path.join(root, table, VERSION_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def write_partition(root, table, site, month, frame):
+    # Merges frame into the (site, month) partition; safe to repeat for rows that were already archived
+    path = partition_path(root, table, site, month)
+    schema = TABLE_SCHEMAS[table]
+    frame = frame[schema.names].copy()
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    if os.path.exists(path):
+        existing = pq.read_table(path).to_pandas()
+        frame = pd.concat([existing, frame], ignore_index=True).drop_duplicates(id_column(table), keep='last')
+    frame = frame.sort_values(['asset_id', 'timestamp'], kind='stable')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written beside the final name then renamed, so readers never see a half-written file
+    staging = os.path.join(os.path.dirname(path), f'.part-0.{os.getpid()}.tmp')
+    pq.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False), staging,
+                   row_group_size=ROW_GROUP_ROWS, compression='zstd')
+    os.replace(staging, path)
+
+
+def mark_updated(root, table):
+    # Readers rediscover the partitions of a table whenever this marker changes
+    marker = os.path.join(root, table, VERSION_FILE)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, 'w') as out:
+        out.write(pd.Timestamp.now().isoformat())
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def open_dataset(root, table):
+    # Discovered once per archive update; files are memory-mapped rather than read into buffers
+    version = _version(root, table)
+    if version is None:
+        return None
+    key = (root, table)
+    with _datasets_lock:
+        cached = _datasets.get(key)
+        if cached is None or cached[0] != version:
+            dataset = ds.dataset(
+                os.path.join(root, table), format='parquet', partitioning=PARTITIONING,
+                filesystem=pafs.LocalFileSystem(use_mmap=True), ignore_prefixes=['.', '_'])
+            cached = _datasets[key] = (version, dataset)
+        return cached[1]
+
+
+def _filter(asset_ids, site, start, end):
+    # Partition keys prune whole files, asset_id/timestamp prune row groups through Parquet statistics
+    conditions = []
+    if site is not None:
+        conditions.append(ds.field('site') == site)
+    if asset_ids is not None:
+        conditions.append(ds.field('asset_id').isin([int(asset_id) for asset_id in asset_ids]))
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field('month') >= start.strftime('%Y-%m'))
+        conditions.append(ds.field('timestamp') >= pa.scalar(start.to_pydatetime(), pa.timestamp('s')))
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field('month') <= end.strftime('%Y-%m'))
+        conditions.append(ds.field('timestamp') <= pa.scalar(end.to_pydatetime(), pa.timestamp('s')))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read(root, table, asset_ids=None, site=None, start=None, end=None):
+    # Archived rows with the columns of the SQLite table, or None when nothing is archived
+    dataset = open_dataset(root, table)
+    if dataset is None:
+        return None
+    columns = TABLE_SCHEMAS[table].names
+    result = dataset.to_table(columns=columns, filter=_filter(asset_ids, site, start, end))
+    if result.num_rows == 0:
+        return None
+    # Parquet has no second unit, so timestamps come back as milliseconds
+    timestamps = result['timestamp'].cast(pa.timestamp('s'))
+    result = result.set_column(columns.index('timestamp'), 'timestamp', timestamps)
+    return result.to_pandas()
+
+
+def time_bounds(root, table, asset_ids=None, site=None):
+    dataset = open_dataset(root, table)
+    if dataset is None:
+        return None, None
+    timestamps = dataset.to_table(columns=['timestamp'], filter=_filter(asset_ids, site, None, None))['timestamp']
+    if len(timestamps) == 0:
+        return None, None
+    bounds = pc.min_max(timestamps)
+    return pd.Timestamp(bounds['min'].as_py()), pd.Timestamp(bounds['max'].as_py())
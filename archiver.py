@@ -0,0 +1,112 @@
+import argparse
+import sqlite3
+import time
+
+import pandas as pd
+
+import alert_engine
+import archive
+import data_access
+import migrations
+import rollups
+
+
+# Whole months older than this many months before the newest reading move out of SQLite
+KEEP_MONTHS = 3
+ARCHIVED_TABLES = ['energy_usage', 'alerts']
+
+
+def archive_cutoff(conn, keep_months=KEEP_MONTHS):
+    latest = conn.execute('SELECT MAX(timestamp) FROM energy_usage').fetchone()[0]
+    if latest is None:
+        return None
+    return pd.Timestamp(latest).to_period('M').to_timestamp() - pd.DateOffset(months=keep_months)
+
+
+def _first_timestamp(conn, table):
+    # Per-asset MIN subqueries are single seeks on the (asset_id, timestamp) index
+    return conn.execute(
+        f'SELECT MIN((SELECT MIN(timestamp) FROM {table} t WHERE t.asset_id = a.asset_id)) FROM assets a'
+    ).fetchone()[0]
+
+
+def _archivable_ids(conn, table):
+    # Energy rows are only archived once the rollups and the alert engine have consumed them
+    if table != 'energy_usage':
+        return None
+    return min(data_access.get_watermark(conn, rollups.STATE_NAME),
+               data_access.get_watermark(conn, alert_engine.ENERGY_STATE))
+
+
+def archive_partition(conn, root, table, site, month_start, max_id=None):
+    # Copies one site's month into its Parquet partition, then deletes exactly the rows that were copied
+    id_column = archive.id_column(table)
+    columns = ', '.join(f't.{column}' for column in archive.TABLE_SCHEMAS[table].names)
+    sql = (f'SELECT {columns} FROM assets a JOIN {table} t ON t.asset_id = a.asset_id '
+           'AND t.timestamp >= ? AND t.timestamp < ? WHERE a.site = ?')
+    params = [month_start.strftime('%Y-%m-%d %H:%M:%S'),
+              (month_start + pd.DateOffset(months=1)).strftime('%Y-%m-%d %H:%M:%S'), site]
+    if max_id is not None:
+        sql += f' AND t.{id_column} <= ?'
+        params.append(max_id)
+
+    rows = pd.read_sql_query(sql, conn, params=params)
+    if rows.empty:
+        return 0
+
+    archive.write_partition(root, table, site, month_start.strftime('%Y-%m'), rows)
+    archive.mark_updated(root, table)
+    # The partition is durable before anything is deleted; readers drop the brief overlap by id
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.executemany(f'DELETE FROM {table} WHERE {id_column} = ?', ((int(row_id),) for row_id in rows[id_column]))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return len(rows)
+
+
+def archive_history(db_path=None, before=None, keep_months=KEEP_MONTHS, tables=ARCHIVED_TABLES):
+    db_path = db_path or data_access.DB_PATH
+    migrations.migrate(db_path)
+    rollups.refresh(db_path)
+    alert_engine.evaluate(db_path)
+
+    root = archive.archive_dir(db_path)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        cutoff = pd.Timestamp(before).to_period('M').to_timestamp() if before else archive_cutoff(conn, keep_months)
+        stats = {table: 0 for table in tables}
+        if cutoff is None:
+            return stats
+
+        sites = [site for site, in conn.execute('SELECT DISTINCT site FROM assets ORDER BY site')]
+        for table in tables:
+            first = _first_timestamp(conn, table)
+            if first is None:
+                continue
+            max_id = _archivable_ids(conn, table)
+            months = pd.date_range(pd.Timestamp(first).to_period('M').to_timestamp(), cutoff, freq='MS')
+            # Filtered rather than inclusive='left', which still yields the start when it equals the cutoff
+            for month_start in months[months < cutoff]:
+                for site in sites:
+                    stats[table] += archive_partition(conn, root, table, site, month_start, max_id)
+        return stats
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move old energy_usage and alerts rows into the Parquet archive.')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--keep-months', type=int, default=KEEP_MONTHS,
+                        help='whole months to keep in SQLite before the newest reading (default: %(default)s)')
+    parser.add_argument('--before', help='archive every month before this date instead')
+    parser.add_argument('--tables', nargs='+', choices=ARCHIVED_TABLES, default=ARCHIVED_TABLES)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = archive_history(args.db, args.before, args.keep_months, args.tables)
+    print(', '.join(f'archived {count} {table} rows' for table, count in stats.items())
+          + f' to {archive.archive_dir(args.db)} in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,63 @@
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import data_access
+
+
+@dataclass(frozen=True)
+class AssetRegistry:
+    # Read-only lookups over the assets table; rebuilt only when the database changes
+    names: MappingProxyType
+    ids: MappingProxyType
+    sites: MappingProxyType
+
+    def name_of(self, asset_id):
+        return self.names.get(int(asset_id), f'Asset {asset_id}')
+
+    def id_of(self, site, name):
+        # Names are only unique within a site
+        return self.ids.get((site, name))
+
+    def site_assets(self, site):
+        return self.sites.get(site, ())
+
+    def site_asset_names(self, site):
+        return [self.names[asset_id] for asset_id in self.site_assets(site)]
+
+
+def build_registry(assets):
+    site_ids = {}
+    for asset_id, site in zip(assets['asset_id'], assets['site']):
+        site_ids.setdefault(site, []).append(int(asset_id))
+
+    return AssetRegistry(
+        names=MappingProxyType({int(asset_id): name for asset_id, name in zip(assets['asset_id'], assets['name'])}),
+        ids=MappingProxyType({(site, name): int(asset_id)
+                              for asset_id, name, site in zip(assets['asset_id'], assets['name'], assets['site'])}),
+        sites=MappingProxyType({site: tuple(ids) for site, ids in site_ids.items()}),
+    )
+
+
+_registry = None
+_registry_version = None
+_registry_lock = threading.Lock()
+
+
+def load_registry(db_paths=None):
+    # Assets of every database, so sites in their own shards show up side by side
+    global _registry, _registry_version
+
+    db_paths = data_access.databases() if db_paths is None else list(db_paths)
+    version = tuple((db_path, data_access.get_pool(db_path).data_version()) for db_path in db_paths)
+    with _registry_lock:
+        if _registry is None or version != _registry_version:
+            frames = data_access.fan_out(lambda db_path: data_access.read_sql(
+                'SELECT asset_id, name, site FROM assets ORDER BY asset_id', db_path=db_path), db_paths)
+            assets = data_access.merge(frames, ['asset_id'])
+            duplicated = assets['asset_id'][assets['asset_id'].duplicated()]
+            if not duplicated.empty:
+                raise ValueError(f'asset ids {sorted(set(duplicated))} are used by more than one database')
+            _registry = build_registry(assets)
+            _registry_version = version
+        return _registry
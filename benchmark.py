@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+VIEWS = ['energy_asset', 'energy_site', 'volume_asset', 'volume_site', 'alerts_asset', 'alerts_site', 'utility_summary']
+
+
+def _view_phases(site, asset_id):
+    # (fetch, render) pairs mirroring what main() does for each dashboard view
+    import billing
+    import data_access
+    import views
+    import asset_registry
+
+    site_ids = list(asset_registry.load_registry().site_assets(site))
+    return {
+        'energy_asset': (lambda: views.load_energy_view(None, asset_id=asset_id)[0],
+                         lambda data: views.display_energy(data, asset_id, site)),
+        'energy_site': (lambda: views.load_energy_view(None, site=site)[0],
+                        lambda data: views.display_energy(data, site_ids, site)),
+        'volume_asset': (lambda: data_access.load_batches(asset_id),
+                         lambda data: views.display_volume(data, asset_id, site)),
+        'volume_site': (lambda: data_access.load_site_batches(site),
+                        lambda data: views.display_volume(data, site_ids, site)),
+        'alerts_asset': (lambda: data_access.load_alerts(asset_id),
+                         lambda data: views.display_alerts(data, asset_id, site)),
+        'alerts_site': (lambda: data_access.load_site_alerts(site),
+                        lambda data: views.display_alerts(data, site_ids, site)),
+        # display_utility_summary reads the bills itself; after the fetch phase that read is a cache hit
+        'utility_summary': (billing.load_bills,
+                            lambda data: views.display_utility_summary()),
+    }
+
+
+def _summary(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'samples': len(samples),
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'max_ms': round(float(samples.max()), 3),
+    }
+
+
+def run(db_path, iterations=5, warm=False, views=VIEWS, site=None, asset_id=None):
+    # Everything imported from here on reads SUSTAINABILITY_DB, so set it before the first import
+    os.environ['SUSTAINABILITY_DB'] = db_path
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    import matplotlib.pyplot as plt
+    import streamlit.config
+    import streamlit.logger
+
+    # Calling st.* outside a running app is supported ("bare mode") but warns on every call.
+    # Streamlit re-applies its configured log level whenever the config is (re)parsed
+    streamlit.logger.set_log_level('error')
+    streamlit.config.on_config_parsed(lambda: streamlit.logger.set_log_level('error'))
+
+    import asset_registry
+    import data_access
+    import render_cache
+
+    registry = asset_registry.load_registry()
+    site = site or next(iter(registry.sites))
+    asset_id = asset_id or registry.site_assets(site)[0]
+    phases = _view_phases(site, asset_id)
+
+    scratch = tempfile.mkdtemp(prefix='render_cache_')
+    render_cache.CACHE_DIR = scratch
+    timings = {view: {'fetch': [], 'render': []} for view in views}
+    try:
+        for _ in range(iterations):
+            for view in views:
+                fetch, render = phases[view]
+                if not warm:
+                    data_access.clear_cache()
+                    shutil.rmtree(scratch, ignore_errors=True)
+
+                started = time.perf_counter()
+                data = fetch()
+                fetched = time.perf_counter()
+                render(data)
+                rendered = time.perf_counter()
+                plt.close('all')
+
+                timings[view]['fetch'].append(fetched - started)
+                timings[view]['render'].append(rendered - fetched)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    conn = data_access.get_pool(db_path)
+    with conn.connection() as db:
+        energy_rows = db.execute('SELECT MAX(usage_id) FROM energy_usage').fetchone()[0] or 0
+
+    return {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'db': os.path.abspath(db_path),
+        'energy_rows': energy_rows,
+        'assets': len(registry.names),
+        'site': site,
+        'asset_id': asset_id,
+        'mode': 'warm' if warm else 'cold',
+        'iterations': iterations,
+        'python': platform.python_version(),
+        'views': {
+            view: {phase: _summary(samples) for phase, samples in phase_timings.items()}
+            for view, phase_timings in timings.items()
+        },
+    }
+
+
+def _print_table(result, out):
+    print(f"{result['mode']} run on {result['db']} ({result['energy_rows']} energy rows, "
+          f"{result['assets']} assets, {result['iterations']} iterations)", file=out)
+    print(f"{'view':<16}{'fetch p50':>12}{'fetch p95':>12}{'render p50':>12}{'render p95':>12}", file=out)
+    for view, phases in result['views'].items():
+        print(f"{view:<16}{phases['fetch']['p50_ms']:>12.1f}{phases['fetch']['p95_ms']:>12.1f}"
+              f"{phases['render']['p50_ms']:>12.1f}{phases['render']['p95_ms']:>12.1f}", file=out)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the fetch and render phase of every dashboard view headlessly.')
+    parser.add_argument('--db', default=os.environ.get('SUSTAINABILITY_DB', 'sustainability_data.db'),
+                        help='database to benchmark (see synthetic_data.py to generate one at scale)')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--warm', action='store_true', help='keep query and render caches between iterations')
+    parser.add_argument('--views', nargs='+', choices=VIEWS, default=VIEWS)
+    parser.add_argument('--site')
+    parser.add_argument('--asset-id', type=int)
+    parser.add_argument('--output', help='append the JSON result as one line to this file')
+    args = parser.parse_args()
+
+    result = run(args.db, args.iterations, args.warm, args.views, args.site, args.asset_id)
+    _print_table(result, sys.stderr)
+    if args.output:
+        with open(args.output, 'a') as out:
+            out.write(json.dumps(result) + '\n')
+    else:
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,136 @@
+import argparse
+
+import pandas as pd
+
+import data_access
+import migrations
+import rollups
+
+
+# Periods averaged into the peak-demand trend
+PEAK_TREND_PERIODS = 3
+
+# Deltas are taken over every bill of the selected sites, then the date filter applies, so the first
+# period of a slice still gets its change from the bill before it
+BILLS_SQL = f'''
+    SELECT * FROM (
+        SELECT site, billing_period_start, billing_period_end, total_kwh, peak_kw, average_kw, billing_amount,
+            billing_amount / NULLIF(total_kwh, 0) AS cost_per_kwh,
+            total_kwh - LAG(total_kwh) OVER periods AS total_kwh_delta,
+            billing_amount - LAG(billing_amount) OVER periods AS billing_amount_delta,
+            billing_amount / NULLIF(total_kwh, 0)
+                - LAG(billing_amount / NULLIF(total_kwh, 0)) OVER periods AS cost_per_kwh_delta,
+            peak_kw - LAG(peak_kw) OVER periods AS peak_kw_delta,
+            AVG(peak_kw) OVER (periods ROWS {PEAK_TREND_PERIODS - 1} PRECEDING) AS peak_kw_trend
+        FROM utility_summary
+        {{site_clause}}
+        WINDOW periods AS (PARTITION BY site ORDER BY billing_period_start)
+    )
+    WHERE 1 = 1{{date_clause}}
+    ORDER BY site, billing_period_start
+'''
+
+
+# Columns of load_bills and reconcile, for the empty frame of a selection with no sites in it
+BILLS_COLUMNS = ['site', 'billing_period_start', 'billing_period_end', 'total_kwh', 'peak_kw', 'average_kw',
+                 'billing_amount', 'cost_per_kwh', 'total_kwh_delta', 'billing_amount_delta', 'cost_per_kwh_delta',
+                 'peak_kw_delta', 'peak_kw_trend']
+RECONCILE_COLUMNS = ['site', 'billing_period_start', 'billed_kwh', 'metered_kwh', 'difference_kwh']
+
+
+def _site_clause(sites):
+    if sites is None:
+        return '', []
+    sites = list(sites)
+    return f"WHERE site IN ({', '.join('?' for _ in sites)})", sites
+
+
+def _date_clause(column, start, end):
+    # Billing dates are stored as 'YYYY-MM-DD' text
+    clause, params = '', []
+    if start is not None:
+        clause += f' AND {column} >= ?'
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        clause += f' AND {column} <= ?'
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    return clause, params
+
+
+def _databases(sites, db_path):
+    # Bills are per site, so with sharded sites every query runs on each shard involved and the results are merged;
+    # the window functions partition by site and come out the same either way
+    return [db_path] if db_path is not None else data_access.site_databases(sites)
+
+
+def billed_sites(db_path=None):
+    frames = data_access.fan_out(
+        lambda path: data_access.read_sql('SELECT DISTINCT site FROM utility_summary', db_path=path),
+        _databases(None, db_path))
+    return sorted({str(site) for frame in frames for site in frame['site']})
+
+
+def period_bounds(db_path=None):
+    frames = data_access.fan_out(lambda path: data_access.read_sql(
+        'SELECT MIN(billing_period_start) AS first, MAX(billing_period_start) AS last FROM utility_summary',
+        db_path=path), _databases(None, db_path))
+    firsts = [frame['first'].iloc[0] for frame in frames if frame['first'].iloc[0] is not None]
+    lasts = [frame['last'].iloc[0] for frame in frames if frame['last'].iloc[0] is not None]
+    if not firsts:
+        return None, None
+    return pd.Timestamp(min(firsts)), pd.Timestamp(max(lasts))
+
+
+def load_bills(sites=None, start=None, end=None, db_path=None):
+    # Bills of the selected sites whose period starts in [start, end], with period-over-period deltas,
+    # cost per kWh and a rolling peak-demand trend, all computed in SQLite
+    site_clause, site_params = _site_clause(sites)
+    date_clause, date_params = _date_clause('billing_period_start', start, end)
+    sql = BILLS_SQL.format(site_clause=site_clause, date_clause=date_clause)
+    frames = data_access.fan_out(lambda path: data_access.read_sql(sql, (*site_params, *date_params), db_path=path),
+                                 _databases(sites, db_path))
+    return data_access.merge(frames, ['site', 'billing_period_start'], BILLS_COLUMNS)
+
+
+def site_totals(bills):
+    # One row per site over the selected periods
+    if bills.empty:
+        return pd.DataFrame(columns=['site', 'periods', 'total_kwh', 'billing_amount', 'cost_per_kwh', 'max_peak_kw'])
+    totals = bills.groupby('site', observed=True).agg(
+        periods=('billing_period_start', 'size'),
+        total_kwh=('total_kwh', 'sum'),
+        billing_amount=('billing_amount', 'sum'),
+        max_peak_kw=('peak_kw', 'max'),
+    ).reset_index()
+    totals['cost_per_kwh'] = totals['billing_amount'] / totals['total_kwh'].where(totals['total_kwh'] != 0)
+    return totals[['site', 'periods', 'total_kwh', 'billing_amount', 'cost_per_kwh', 'max_peak_kw']]
+
+
+def reconcile(sites=None, start=None, end=None, db_path=None):
+    # Billed kWh next to the metered kWh of the monthly rollup; rollups must already be refreshed
+    frames = data_access.fan_out(lambda path: rollups.utility_cross_check(path, sites, start, end),
+                                 _databases(sites, db_path))
+    frame = data_access.merge(frames, ['site', 'billing_period_start'], RECONCILE_COLUMNS)
+    frame['difference_pct'] = frame['difference_kwh'] / frame['billed_kwh'].where(frame['billed_kwh'] != 0) * 100
+    return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print billing analytics per site and period.')
+    parser.add_argument('--db', help='one database (default: the configured database, or every site shard)')
+    parser.add_argument('--sites', nargs='+')
+    parser.add_argument('--start', help='first billing period to include')
+    parser.add_argument('--end', help='last billing period to include')
+    parser.add_argument('--reconcile', action='store_true', help='compare billed with metered kWh instead')
+    args = parser.parse_args()
+
+    if args.reconcile:
+        for db_path in [args.db] if args.db else data_access.databases():
+            migrations.migrate(db_path)
+            rollups.refresh(db_path)
+        print(reconcile(args.sites, args.start, args.end, args.db).to_string(index=False))
+    else:
+        bills = load_bills(args.sites, args.start, args.end, args.db)
+        print(bills.to_string(index=False))
+        print()
+        print(site_totals(bills).to_string(index=False))
@@ -0,0 +1,111 @@
+import altair as alt
+import pandas as pd
+
+import downsample
+import tracing
+
+
+# Name of the x-interval brush on every interactive chart; dragging across a chart selects a range to load
+ZOOM_SELECTION = 'zoom'
+
+# Points shipped to the browser per series; about one per horizontal pixel of a full-width chart
+CHART_POINTS = downsample.DEFAULT_MAX_POINTS
+
+# Markers only help when the individual readings can actually be told apart
+MARKER_POINT_LIMIT = 100
+
+ALERT_LAYERS = ['Alert Value', 'Threshold', 'Exceeds Threshold']
+ALERT_COLORS = ['blue', 'red', 'orange']
+
+
+def _zoom_brush():
+    return alt.selection_interval(encodings=['x'], name=ZOOM_SELECTION)
+
+
+def brushed_range(state):
+    # (start, end) of the brush in a chart's selection state, or None when nothing is selected.
+    # Vega-Lite reports temporal brushes as epoch milliseconds
+    try:
+        values = state['selection'][ZOOM_SELECTION]['timestamp']
+    except (KeyError, TypeError):
+        return None
+    if not values or len(values) != 2:
+        return None
+    unit = 'ms' if isinstance(values[0], (int, float)) else None
+    start, end = sorted(pd.to_datetime(values, unit=unit))
+    return start, end
+
+
+def _points(frame, column, series):
+    # Downsample each series on the server so only what the chart can show crosses the wire
+    if not series:
+        return downsample.downsample(frame, 'timestamp', column, CHART_POINTS)
+    return pd.concat([downsample.downsample(df, 'timestamp', column, CHART_POINTS).assign(**{series: name})
+                      for name, df in frame.groupby(series, sort=False, observed=True)], ignore_index=True)
+
+
+@tracing.traced('render')
+def series_chart(frame, column, title, color=None, series=None):
+    points = _points(frame, column, series)
+    per_series = len(points) / max(1, points[series].nunique()) if series else len(points)
+    chart = alt.Chart(points).mark_line(point=per_series <= MARKER_POINT_LIMIT, color=color or alt.Undefined).encode(
+        x=alt.X('timestamp:T', title='Timestamp'),
+        y=alt.Y(f'{column}:Q', title=title, scale=alt.Scale(zero=False)),
+        tooltip=[alt.Tooltip('timestamp:T', format='%Y-%m-%d %H:%M'), alt.Tooltip(f'{column}:Q', format='.2f')],
+    )
+    if series:
+        chart = chart.encode(color=alt.Color(f'{series}:N', title=None))
+    return chart.add_params(_zoom_brush())
+
+
+@tracing.traced('render')
+def alert_chart(subset):
+    # Each alert is a short horizontal bar at its value and threshold, shaded where the value exceeds it
+    alerts = subset[['timestamp', 'value', 'threshold']].copy()
+    alerts['start'] = alerts['timestamp'] - pd.Timedelta(minutes=30)
+    alerts['end'] = alerts['timestamp'] + pd.Timedelta(minutes=30)
+
+    # Every layer tags itself so they share one colour scale and one legend
+    color = alt.Color('layer:N', title=None, scale=alt.Scale(domain=ALERT_LAYERS, range=ALERT_COLORS))
+    base = alt.Chart(alerts).encode(x=alt.X('start:T', title='Timestamp'), x2='end:T', color=color)
+
+    values = base.transform_calculate(layer=f"'{ALERT_LAYERS[0]}'").mark_rule(strokeWidth=2).encode(
+        y=alt.Y('value:Q', title='Value', scale=alt.Scale(zero=False)))
+    thresholds = base.transform_calculate(layer=f"'{ALERT_LAYERS[1]}'").mark_rule(
+        strokeWidth=2, strokeDash=[4, 4]).encode(y='threshold:Q')
+    exceeds = base.transform_filter(alt.datum.value > alt.datum.threshold).transform_calculate(
+        layer=f"'{ALERT_LAYERS[2]}'").mark_rect(opacity=0.3).encode(y='threshold:Q', y2='value:Q')
+    markers = alt.Chart(alerts).mark_rule(color='gray', strokeDash=[1, 2], strokeWidth=0.5).encode(
+        x='timestamp:T',
+        tooltip=[alt.Tooltip('timestamp:T', format='%Y-%m-%d %H:%M'), 'value:Q', 'threshold:Q'])
+
+    # The brush lives on the marker layer, whose x field is the alert timestamp itself
+    return alt.layer(markers.add_params(_zoom_brush()), values, thresholds, exceeds)
+
+
+@tracing.traced('render')
+def small_multiples(frame, column, title, series, columns=3):
+    # One small panel per series on shared axes; frame is expected to be on a common, already-budgeted grid
+    per_series = len(frame) / max(1, frame[series].nunique())
+    chart = alt.Chart(frame.dropna(subset=[column])).mark_line(point=per_series <= MARKER_POINT_LIMIT).encode(
+        x=alt.X('timestamp:T', title=None),
+        y=alt.Y(f'{column}:Q', title=title, scale=alt.Scale(zero=False)),
+        tooltip=[alt.Tooltip('timestamp:T', format='%Y-%m-%d %H:%M'), alt.Tooltip(f'{column}:Q', format='.2f')],
+    ).properties(height=120)
+    return chart.add_params(_zoom_brush()).facet(facet=alt.Facet(f'{series}:N', title=None), columns=columns)
+
+
+@tracing.traced('render')
+def efficiency_chart(frame):
+    # One point per attributed batch at its start, coloured by product; thousands of batches stay a light payload
+    points = frame[['batch_id', 'asset_name', 'product_name', 'start_time', 'volume_gallons', 'energy_kwh',
+                    'kwh_per_gallon']].dropna(subset=['kwh_per_gallon'])
+    return alt.Chart(points).mark_circle(size=30, opacity=0.7).encode(
+        x=alt.X('start_time:T', title='Batch Start'),
+        y=alt.Y('kwh_per_gallon:Q', title='kWh per Gallon', scale=alt.Scale(zero=False)),
+        color=alt.Color('product_name:N', title=None),
+        tooltip=['batch_id:Q', 'asset_name:N', 'product_name:N',
+                 alt.Tooltip('start_time:T', format='%Y-%m-%d %H:%M'),
+                 alt.Tooltip('volume_gallons:Q', format='.1f'), alt.Tooltip('energy_kwh:Q', format='.1f'),
+                 alt.Tooltip('kwh_per_gallon:Q', format='.3f')],
+    )
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_access
+import downsample
+import rollups
+import tracing
+
+
+MAX_COMPARED_ASSETS = 36
+# Points per comparison chart, shared by however many assets are on it
+POINT_BUDGET = 2400
+MIN_POINTS_PER_ASSET = 24
+
+
+def grid_size(asset_count, point_budget=POINT_BUDGET):
+    # Bins per asset: the budget split across assets, never more than a chart can show per series
+    per_asset = point_budget // max(1, asset_count)
+    return max(MIN_POINTS_PER_ASSET, min(downsample.DEFAULT_MAX_POINTS, per_asset))
+
+
+def coverage(asset_ids):
+    return rollups.merge_coverage([rollups.coverage(asset_id=asset_id) for asset_id in asset_ids])
+
+
+def load_series(asset_ids, resolution, start, end):
+    # One indexed query per asset, run concurrently over the read-only connection pool.
+    # Rollups must already be refreshed: cached Streamlit calls can't be made from worker threads
+    def load(asset_id):
+        if resolution == 'raw':
+            return data_access.load_energy_usage(asset_id, start=start, end=end)
+        return rollups.load_energy_rollup(resolution, asset_id=asset_id, start=start, end=end)
+
+    workers = max(1, min(len(asset_ids), data_access.POOL_SIZE))
+    with ThreadPoolExecutor(max_workers=workers, initializer=data_access.bind_worker,
+                            initargs=(data_access.current_session(), tracing.current())) as pool:
+        return dict(zip(asset_ids, pool.map(load, asset_ids)))
+
+
+def align(series, column, start, end, bins):
+    # Every series averaged onto the same grid of bins in a single grouped mean: one row per bin centre,
+    # one column per asset, NaN where an asset has no readings in a bin
+    step = (end - start) / bins
+    grid = pd.DatetimeIndex(start + step * (np.arange(bins) + 0.5), name='timestamp')
+
+    frames = [frame[['timestamp', column]].assign(asset_id=asset_id)
+              for asset_id, frame in series.items() if not frame.empty]
+    if not frames:
+        return pd.DataFrame(index=grid, columns=list(series), dtype=float)
+
+    readings = pd.concat(frames, ignore_index=True)
+    offsets = (readings['timestamp'] - start) / step
+    readings['bin'] = np.clip(offsets.to_numpy().astype(np.int64), 0, bins - 1)
+    wide = readings.groupby(['bin', 'asset_id'])[column].mean().unstack('asset_id')
+    wide = wide.reindex(index=range(bins), columns=list(series))
+    wide.index = grid
+    return wide
@@ -0,0 +1 @@
+# The app is a set of flat modules at the repository root; this file puts them on the path of the tests
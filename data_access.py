@@ -0,0 +1,517 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import archive
+import shards
+import tracing
+
+
+# Overridable so benchmarks and tools can point the whole app at another database file
+DB_PATH = os.environ.get('SUSTAINABILITY_DB', 'sustainability_data.db')
+POOL_SIZE = 4
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 128
+# Sessions whose hit/miss counters are kept; the least recently active are dropped past this
+CACHE_MAX_SESSIONS = 1000
+
+# Dtypes applied once when a frame is read, so cached frames are already parsed and compact. Dates are stored
+# as fixed-format text; every other REAL column is a measurement that float32 holds to well within its precision
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATETIME_FORMATS = {
+    'timestamp': TIMESTAMP_FORMAT,
+    'start_time': TIMESTAMP_FORMAT,
+    'end_time': TIMESTAMP_FORMAT,
+    'last_updated': TIMESTAMP_FORMAT,
+    'billing_period_start': '%Y-%m-%d',
+    'billing_period_end': '%Y-%m-%d',
+}
+DATETIME_DTYPE = 'datetime64[s]'
+CATEGORY_COLUMNS = {'site', 'alert_type', 'product_name', 'asset_name'}
+# Money keeps full precision so billing totals add up to the cent
+FLOAT64_COLUMNS = {'billing_amount', 'billing_amount_delta'}
+
+
+class ConnectionPool:
+    # Small pool of read-only connections shared by every Streamlit session
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self._uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+        self._idle = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+        # Dedicated connection used only to watch for commits made by other connections
+        self._watcher = self._connect()
+        self._watcher_lock = threading.Lock()
+
+    def _connect(self):
+        return sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def data_version(self):
+        # Changes whenever the file is replaced/touched or another connection commits to it
+        with self._watcher_lock:
+            version = self._watcher.execute('PRAGMA data_version').fetchone()[0]
+        return os.stat(self.db_path).st_mtime_ns, version
+
+
+class QueryCache:
+    # TTL + LRU cache of query results keyed on (db_path, sql, params). Each database has its own version, so a
+    # commit to one site's shard only drops that shard's entries
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, max_sessions=CACHE_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._session_stats = OrderedDict()
+
+    def _stats_of(self, session_id):
+        # Caller holds the lock. Sessions never say when they end, so their counters are kept LRU
+        stats = self._session_stats.get(session_id)
+        if stats is None:
+            stats = self._session_stats[session_id] = {'hits': 0, 'misses': 0, 'shared': 0}
+            while len(self._session_stats) > self.max_sessions:
+                self._session_stats.popitem(last=False)
+        else:
+            self._session_stats.move_to_end(session_id)
+        return stats
+
+    def _check_version(self, db_path, version):
+        if self._versions.get(db_path) != version:
+            for key in [key for key in self._entries if key[0] == db_path]:
+                del self._entries[key]
+            self._versions[db_path] = version
+
+    def get(self, key, version, session_id=None):
+        with self._lock:
+            self._check_version(key[0], version)
+
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+
+            stats = self._stats_of(session_id)
+            if entry is None:
+                stats['misses'] += 1
+                return None
+
+            stats['hits'] += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def record_shared(self, session_id=None):
+        # A miss that waited for another session's identical query instead of running it again
+        with self._lock:
+            self._stats_of(session_id)['shared'] += 1
+
+    def put(self, key, version, frame):
+        with self._lock:
+            if version != self._versions.get(key[0]):
+                return
+            self._entries[key] = (time.monotonic(), frame)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self, session_id=None):
+        with self._lock:
+            stats = dict(self._session_stats.get(session_id, {'hits': 0, 'misses': 0, 'shared': 0}))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_cache = QueryCache()
+_local = threading.local()
+# Computations in progress, so concurrent misses on one key wait for a single query
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_pool(db_path=None):
+    db_path = db_path or DB_PATH
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+def databases():
+    # Every database holding dashboard data: one per site when sharded, otherwise the one database
+    if shards.SITE_DBS:
+        return list(dict.fromkeys(shards.SITE_DBS.values()))
+    return [DB_PATH]
+
+
+def site_db(site):
+    # Database holding a site's rows
+    if not shards.SITE_DBS:
+        return DB_PATH
+    if site not in shards.SITE_DBS:
+        raise ValueError(f'no database is configured for site {site!r}')
+    return shards.SITE_DBS[site]
+
+
+def site_databases(sites=None):
+    # Databases holding the given sites (every database when sites is None), each once
+    if sites is None or not shards.SITE_DBS:
+        return databases()
+    return list(dict.fromkeys(site_db(site) for site in sites))
+
+
+def asset_db(asset_id):
+    # Database whose assets table has the asset
+    if not shards.SITE_DBS:
+        return DB_PATH
+    for db_path in databases():
+        asset_ids = _cached((db_path, 'asset ids'), lambda: frozenset(
+            read_sql('SELECT asset_id FROM assets', db_path=db_path)['asset_id'].astype(int)), db_path)
+        if int(asset_id) in asset_ids:
+            return db_path
+    raise ValueError(f'no database has asset {asset_id}')
+
+
+def bind_worker(session_id, trace):
+    # Worker threads attribute cache stats and spans to the session that started them
+    bind_session(session_id)
+    tracing.bind(trace)
+
+
+def fan_out(function, db_paths=None):
+    # function(db_path) on every database at once, results in database order. Threads because the time goes
+    # into SQLite and Parquet reads, which release the GIL
+    db_paths = databases() if db_paths is None else list(db_paths)
+    # No databases, e.g. an empty site selection when sharded: nothing to run
+    if not db_paths:
+        return []
+    if len(db_paths) == 1:
+        return [function(db_paths[0])]
+    with ThreadPoolExecutor(max_workers=len(db_paths), thread_name_prefix='fan-out', initializer=bind_worker,
+                            initargs=(current_session(), tracing.current())) as pool:
+        return list(pool.map(function, db_paths))
+
+
+def merge(frames, order, columns=()):
+    # Results of the same query on several shards, in one frame sorted as a single database would have sorted it.
+    # No frames at all (no database was queried) gives an empty frame with the given columns
+    if not frames:
+        return typed(pd.DataFrame(columns=list(columns)))
+    frames = [frame for frame in frames if not frame.empty] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    # Categories differ between shards, so concat falls back to strings until typed() again
+    return typed(pd.concat(frames, ignore_index=True).sort_values(order, kind='stable', ignore_index=True))
+
+
+def bind_session(session_id):
+    # Streamlit runs each session's script on its own thread, so stats are attributed per thread
+    _local.session_id = session_id
+
+
+def current_session():
+    return getattr(_local, 'session_id', None)
+
+
+def db_signature(db_path):
+    # Size and mtime of the database and its WAL: any commit touches one of them
+    signature = []
+    for path in (db_path, f'{db_path}-wal'):
+        try:
+            stat = os.stat(path)
+            signature.append([stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            signature.append(None)
+    return signature
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def cache_stats(session_id=None):
+    if session_id is None:
+        session_id = current_session()
+    return _cache.stats(session_id)
+
+
+def _cached(key, compute, db_path):
+    version = get_pool(db_path).data_version()
+    value = _cache.get(key, version, current_session())
+    if value is not None:
+        return value
+
+    # Single flight: when many sessions open the same view at once, the first one runs the query
+    # and the rest wait for its result
+    with _inflight_lock:
+        flight = _inflight.get((key, version))
+        leader = flight is None
+        if leader:
+            flight = _inflight[key, version] = Future()
+    if not leader:
+        _cache.record_shared(current_session())
+        return flight.result()
+
+    try:
+        value = compute()
+        _cache.put(key, version, value)
+        flight.set_result(value)
+        return value
+    except BaseException as exc:
+        flight.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key, version]
+
+
+def typed(frame):
+    # Parses and downcasts in place; columns that already have their dtype are left alone
+    for column in frame.columns:
+        values = frame[column]
+        if column in DATETIME_FORMATS:
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                # Empty text columns already parse to [s], so the parsed values are always written back
+                frame[column] = pd.to_datetime(values, format=DATETIME_FORMATS[column]).astype(DATETIME_DTYPE)
+            elif values.dtype != DATETIME_DTYPE:
+                frame[column] = values.astype(DATETIME_DTYPE)
+        elif column in CATEGORY_COLUMNS:
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                frame[column] = values.astype('category')
+        elif values.dtype == 'float64' and column not in FLOAT64_COLUMNS:
+            frame[column] = values.astype('float32')
+    return frame
+
+
+def exported(frame):
+    # Copy of a frame for output that leaves the process (API bodies, CSV files): float32 columns go back to
+    # float64 rounded to the 7 significant digits float32 holds, so 52.4 is written as 52.4, not 52.4000015259
+    frame = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype == 'float32':
+            values = frame[column].to_numpy(dtype='float64')
+            with np.errstate(divide='ignore', invalid='ignore'):
+                digits = 6 - np.floor(np.log10(np.abs(values)))
+            scale = 10.0 ** np.where(np.isfinite(digits), digits, 0)
+            frame[column] = np.round(values * scale) / scale
+    return frame
+
+
+def read_sql(sql, params=(), db_path=None):
+    db_path = db_path or DB_PATH
+    def query():
+        with get_pool(db_path).connection() as conn:
+            return typed(pd.read_sql_query(sql, conn, params=params))
+
+    # Callers are free to mutate what they get back, so never hand out the cached frame itself
+    with tracing.span('read_sql', 'query'):
+        return _cached((db_path, sql, tuple(params)), query, db_path).copy()
+
+
+def read_archive(table, asset_ids=None, site=None, start=None, end=None, db_path=None):
+    # Cold rows from the columnar archive, cached like queries: archiving always commits to the database as well
+    db_path = db_path or DB_PATH
+    def scan():
+        frame = archive.read(archive.archive_dir(db_path), table, asset_ids, site, start, end)
+        if frame is None:
+            return pd.DataFrame(columns=archive.TABLE_SCHEMAS[table].names)
+        return typed(frame)
+
+    asset_ids = None if asset_ids is None else tuple(int(asset_id) for asset_id in asset_ids)
+    with tracing.span('read_archive', 'query'):
+        return _cached((db_path, 'archive', table, asset_ids, site, start, end), scan, db_path).copy()
+
+
+def archive_time_bounds(table, asset_ids=None, site=None, db_path=None):
+    db_path = db_path or DB_PATH
+    asset_ids = None if asset_ids is None else tuple(int(asset_id) for asset_id in asset_ids)
+    return _cached((db_path, 'archive bounds', table, asset_ids, site),
+                   lambda: archive.time_bounds(archive.archive_dir(db_path), table, asset_ids, site), db_path)
+
+
+def with_archive(hot, cold, order):
+    # Archived rows are normally all older, but late-arriving readings can interleave with them, and rows
+    # caught between an archive write and its delete exist on both sides for a moment
+    if cold.empty:
+        return hot
+    frame = cold
+    if not hot.empty:
+        # Categories differ between the two sides, so concat falls back to strings until typed() again
+        frame = pd.concat([cold, hot], ignore_index=True).drop_duplicates(cold.columns[0], keep='last')
+    return typed(frame.sort_values(order, kind='stable', ignore_index=True))
+
+
+def _with_asset_names(cold, site):
+    if cold.empty:
+        return cold
+    names = read_sql('SELECT asset_id, name AS asset_name FROM assets WHERE site = ?', (site,), site_db(site))
+    return cold.merge(names, on='asset_id', how='inner')
+
+
+def get_watermark(conn, name):
+    # High-water marks of the incremental jobs (rollups, alert engine, ...) live in one table
+    row = conn.execute('SELECT high_water_mark FROM watermarks WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_watermark(conn, name, high_water_mark):
+    conn.execute('INSERT INTO watermarks (name, high_water_mark) VALUES (?, ?) '
+                 'ON CONFLICT (name) DO UPDATE SET high_water_mark = excluded.high_water_mark',
+                 (name, high_water_mark))
+
+
+# Loaders read from the database of the asset or site they are given
+def load_site_assets(site):
+    return read_sql('SELECT * FROM assets WHERE site = ?', (site,), site_db(site))
+
+
+def time_range_clause(column, start, end):
+    # Timestamps are stored as 'YYYY-MM-DD HH:MM:SS' text, which compares correctly as a string
+    clause, params = '', []
+    if start is not None:
+        clause += f' AND {column} >= ?'
+        params.append(pd.Timestamp(start).strftime(TIMESTAMP_FORMAT))
+    if end is not None:
+        clause += f' AND {column} <= ?'
+        params.append(pd.Timestamp(end).strftime(TIMESTAMP_FORMAT))
+    return clause, params
+
+
+def load_energy_usage(asset_id, start=None, end=None):
+    db_path = asset_db(asset_id)
+    clause, params = time_range_clause('timestamp', start, end)
+    hot = read_sql(f'SELECT * FROM energy_usage WHERE asset_id = ?{clause} ORDER BY timestamp',
+                   (int(asset_id), *params), db_path)
+    return with_archive(hot, read_archive('energy_usage', [asset_id], start=start, end=end, db_path=db_path),
+                        ['timestamp'])
+
+
+def energy_time_bounds(asset_id=None, site=None):
+    # Separate MIN/MAX subqueries so each one is a single seek on the (asset_id, timestamp) index
+    if asset_id is not None:
+        db_path = asset_db(asset_id)
+        frame = read_sql(
+            'SELECT (SELECT MIN(timestamp) FROM energy_usage WHERE asset_id = ?) AS first, '
+            '(SELECT MAX(timestamp) FROM energy_usage WHERE asset_id = ?) AS last',
+            (int(asset_id), int(asset_id)), db_path)
+    else:
+        db_path = site_db(site)
+        frame = read_sql(
+            'SELECT MIN((SELECT MIN(timestamp) FROM energy_usage e WHERE e.asset_id = a.asset_id)) AS first, '
+            'MAX((SELECT MAX(timestamp) FROM energy_usage e WHERE e.asset_id = a.asset_id)) AS last '
+            'FROM assets a WHERE a.site = ?',
+            (site,), db_path)
+    bounds = [frame['first'].iloc[0], frame['last'].iloc[0]]
+    bounds += archive_time_bounds('energy_usage', None if asset_id is None else [asset_id], site, db_path)
+    bounds = [pd.Timestamp(value) for value in bounds if value is not None]
+    if not bounds:
+        return None, None
+    return min(bounds), max(bounds)
+
+
+def load_batches(asset_id):
+    return read_sql('SELECT * FROM batches WHERE asset_id = ? ORDER BY batch_id', (int(asset_id),), asset_db(asset_id))
+
+
+def load_alerts(asset_id, start=None, end=None):
+    db_path = asset_db(asset_id)
+    clause, params = time_range_clause('timestamp', start, end)
+    hot = read_sql(f'SELECT * FROM alerts WHERE asset_id = ?{clause} ORDER BY timestamp', (int(asset_id), *params),
+                   db_path)
+    return with_archive(hot, read_archive('alerts', [asset_id], start=start, end=end, db_path=db_path), ['timestamp'])
+
+
+def load_latest(table, id_column, asset_id, rows, db_path):
+    # Newest hot rows of one asset and the table's highest id, from one read transaction so a row committed in
+    # between is neither missed nor read twice by a later load_since. Uncached: each live view starts once
+    with tracing.span('load_latest', 'query'):
+        with get_pool(db_path).connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                last, = conn.execute(f'SELECT MAX({id_column}) FROM {table}').fetchone()
+                frame = pd.read_sql_query(f'SELECT * FROM {table} WHERE asset_id = ? ORDER BY timestamp DESC LIMIT ?',
+                                          conn, params=(int(asset_id), rows))
+            finally:
+                conn.execute('COMMIT')
+    return typed(frame.iloc[::-1].reset_index(drop=True)), last or 0
+
+
+def load_since(table, id_column, asset_ids, after_id, limit, db_path):
+    # Rows of the assets with an id above after_id, in id order: a range scan of the primary key, so the cost
+    # follows what was written since rather than the table's size. Uncached, as no two ticks ask the same
+    placeholders = ', '.join('?' for _ in asset_ids)
+    with tracing.span('load_since', 'query'):
+        with get_pool(db_path).connection() as conn:
+            return typed(pd.read_sql_query(
+                f'SELECT * FROM {table} WHERE {id_column} > ? AND asset_id IN ({placeholders}) '
+                f'ORDER BY {id_column} LIMIT ?',
+                conn, params=(int(after_id), *map(int, asset_ids), limit)))
+
+
+UTILITY_SUMMARY_COLUMNS = ['summary_id', 'site', 'billing_period_start', 'billing_period_end', 'total_kwh', 'peak_kw',
+                           'average_kw', 'billing_amount']
+
+
+def load_utility_summary():
+    return merge(fan_out(lambda db_path: read_sql('SELECT * FROM utility_summary ORDER BY site, billing_period_start',
+                                                  db_path=db_path)),
+                 ['site', 'billing_period_start'], UTILITY_SUMMARY_COLUMNS)
+
+
+# Site-wide variants used by the overview views: one join per dataset instead of one query per asset
+def load_site_energy_usage(site, start=None, end=None):
+    clause, params = time_range_clause('e.timestamp', start, end)
+    hot = read_sql(
+        'SELECT e.*, a.name AS asset_name FROM energy_usage e '
+        'JOIN assets a ON a.asset_id = e.asset_id '
+        f'WHERE a.site = ?{clause} ORDER BY e.asset_id, e.timestamp',
+        (site, *params), site_db(site))
+    cold = _with_asset_names(read_archive('energy_usage', site=site, start=start, end=end, db_path=site_db(site)),
+                             site)
+    return with_archive(hot, cold, ['asset_id', 'timestamp'])
+
+
+def load_site_batches(site):
+    return read_sql(
+        'SELECT b.*, a.name AS asset_name FROM batches b '
+        'JOIN assets a ON a.asset_id = b.asset_id '
+        'WHERE a.site = ? ORDER BY b.asset_id, b.batch_id',
+        (site,), site_db(site))
+
+
+def load_site_alerts(site, start=None, end=None):
+    clause, params = time_range_clause('al.timestamp', start, end)
+    hot = read_sql(
+        'SELECT al.*, a.name AS asset_name FROM alerts al '
+        'JOIN assets a ON a.asset_id = al.asset_id '
+        f'WHERE a.site = ?{clause} ORDER BY al.asset_id, al.timestamp',
+        (site, *params), site_db(site))
+    cold = _with_asset_names(read_archive('alerts', site=site, start=start, end=end, db_path=site_db(site)), site)
+    return with_archive(hot, cold, ['asset_id', 'timestamp'])
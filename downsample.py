@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+
+# Enough points to fill every horizontal pixel of a default-sized matplotlib figure
+DEFAULT_MAX_POINTS = 640
+
+
+def pixel_budget(fig):
+    return max(int(fig.get_figwidth() * fig.dpi), 3)
+
+
+def _as_numeric(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+    return values.to_numpy(dtype=np.float64)
+
+
+def lttb_indices(x, y, max_points):
+    # Largest-Triangle-Three-Buckets: keep the point in each bucket that forms the largest
+    # triangle with the previously kept point and the average of the next bucket
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = _as_numeric(x)
+    y = _as_numeric(y)
+
+    # Interior points 1..n-2 split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+
+    # The bucket after the last one is the final point itself
+    avg_x = np.append(avg_x, x[-1])
+    avg_y = np.append(avg_y, y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, max_points):
+    # Keep the minimum and maximum of each bucket, so spikes survive at any zoom level
+    n = len(y)
+    n_buckets = (max_points - 2) // 2
+    if n_buckets < 1 or 2 * n_buckets >= n:
+        return np.arange(n)
+
+    y = _as_numeric(y)
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate(([0, n - 1], order[starts], order[ends])))
+
+
+def downsample(df, x_col, y_col, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    # Expects df sorted by x_col; returns the subset of rows to draw for one series
+    series = df[[x_col, y_col]].dropna()
+    if len(series) <= max_points:
+        return series
+
+    if method == 'lttb':
+        idx = lttb_indices(series[x_col], series[y_col], max_points)
+    elif method == 'minmax':
+        idx = minmax_indices(series[y_col], max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return series.iloc[idx]
@@ -0,0 +1,177 @@
+import argparse
+import sqlite3
+import time
+
+import pandas as pd
+
+import archive
+import data_access
+import migrations
+import rollups
+
+
+STATE_NAME = 'efficiency.batches'
+REFRESH_CHUNK_BATCHES = 5000
+# A batch waits for its asset's readings to reach its end_time, but not once the rest of the plant is this far past it
+LATE_READINGS_GRACE = pd.Timedelta(days=1)
+
+
+def energy_curve(readings):
+    # Step-wise power curve per asset: power holds until the next reading, never longer than the rollups allow.
+    # cumulative_kwh is the energy used before each reading, position its index within the asset
+    # Cast explicitly: assets without readings in range leave empty object columns behind
+    curve = readings.astype({'asset_id': 'int64', 'power_kw': 'float64'})
+    curve = curve.sort_values(['asset_id', 'timestamp'], kind='stable').reset_index(drop=True)
+    held = curve.groupby('asset_id')['timestamp'].shift(-1) - curve['timestamp']
+    hours = held.clip(upper=rollups.MAX_INTEGRATION_GAP).dt.total_seconds().fillna(0) / 3600
+    kwh = curve['power_kw'].fillna(0) * hours
+    curve['cumulative_kwh'] = kwh.groupby(curve['asset_id']).cumsum() - kwh
+    curve['position'] = curve.groupby('asset_id').cumcount()
+    return curve
+
+
+def _energy_at(batches, curve, column):
+    # Energy used up to each batch's start or end: the last reading at or before it, plus that reading's power
+    # held until then. A sorted as-of join rather than a batches x readings scan
+    points = batches[['batch_id', 'asset_id', column]].sort_values(column, kind='stable')
+    matched = pd.merge_asof(points, curve[['asset_id', 'timestamp', 'power_kw', 'cumulative_kwh', 'position']],
+                            left_on=column, right_on='timestamp', by='asset_id', direction='backward')
+    since = (matched[column] - matched['timestamp']).clip(upper=rollups.MAX_INTEGRATION_GAP)
+    energy = matched['cumulative_kwh'] + matched['power_kw'].fillna(0).astype('float64') * (
+        since.dt.total_seconds() / 3600)
+    # Before the asset's first reading nothing has been used yet
+    return pd.DataFrame({'energy': energy.fillna(0).to_numpy(), 'position': matched['position'].fillna(-1).to_numpy()},
+                        index=matched['batch_id'])
+
+
+def attribute(batches, readings):
+    # kWh each batch used between start_time and end_time, the readings inside it and kWh per gallon
+    curve = energy_curve(readings).sort_values('timestamp', kind='stable')
+    start = _energy_at(batches, curve, 'start_time')
+    end = _energy_at(batches, curve, 'end_time')
+
+    result = batches[['batch_id', 'asset_id', 'volume_gallons']].set_index('batch_id')
+    result['readings'] = (end['position'] - start['position']).astype('int64')
+    result['energy_kwh'] = end['energy'] - start['energy']
+    result['kwh_per_gallon'] = result['energy_kwh'] / result['volume_gallons'].where(result['volume_gallons'] > 0)
+    return result.reset_index()[['batch_id', 'asset_id', 'readings', 'energy_kwh', 'kwh_per_gallon']]
+
+
+def _readings(conn, db_path, asset_id, start, end):
+    # Hot rows and, for history that has been archived, the Parquet archive
+    hot = data_access.typed(pd.read_sql_query(
+        'SELECT usage_id, asset_id, timestamp, power_kw FROM energy_usage '
+        'WHERE asset_id = ? AND timestamp >= ? AND timestamp <= ? ORDER BY timestamp',
+        conn, params=(int(asset_id), start.strftime(data_access.TIMESTAMP_FORMAT),
+                      end.strftime(data_access.TIMESTAMP_FORMAT))))
+    cold = archive.read(archive.archive_dir(db_path), 'energy_usage', [asset_id], start=start, end=end)
+    if cold is None:
+        return hot
+    return data_access.with_archive(hot, data_access.typed(cold[hot.columns]), ['timestamp'])
+
+
+def _latest_readings(conn, db_path, asset_ids):
+    latest = {}
+    for asset_id in asset_ids:
+        last, = conn.execute('SELECT MAX(timestamp) FROM energy_usage WHERE asset_id = ?', (int(asset_id),)).fetchone()
+        if last is None:
+            last = archive.time_bounds(archive.archive_dir(db_path), 'energy_usage', [asset_id])[1]
+        latest[asset_id] = pd.Timestamp(last) if last is not None else pd.NaT
+    return pd.Series(latest, dtype='datetime64[s]')
+
+
+BATCH_COLUMNS = 'b.batch_id, b.asset_id, b.start_time, b.end_time, b.volume_gallons'
+
+
+def _refresh_chunk(conn, db_path, high_water_mark):
+    # New batches above the watermark plus those still waiting for their readings from earlier passes
+    new = pd.read_sql_query(
+        f'SELECT {BATCH_COLUMNS} FROM batches b WHERE b.batch_id > ? ORDER BY b.batch_id LIMIT ?',
+        conn, params=(high_water_mark, REFRESH_CHUNK_BATCHES))
+    waiting = pd.read_sql_query(
+        f'SELECT {BATCH_COLUMNS} FROM batch_energy e JOIN batches b ON b.batch_id = e.batch_id WHERE e.complete = 0',
+        conn)
+    if new.empty and waiting.empty:
+        return 0, False
+    batches = data_access.typed(pd.concat([frame for frame in (waiting, new) if not frame.empty], ignore_index=True))
+
+    # A batch is attributed once its asset has reported past end_time; late readings after that are not revisited
+    latest = _latest_readings(conn, db_path, batches['asset_id'].unique())
+    ready = ((batches['end_time'] <= batches['asset_id'].map(latest))
+             | (batches['end_time'] <= latest.max() - LATE_READINGS_GRACE)).to_numpy()
+    done = batches[ready]
+
+    if not done.empty:
+        # Typed again because assets without readings in range contribute empty, untyped frames
+        readings = data_access.typed(pd.concat([
+            _readings(conn, db_path, asset_id, group['start_time'].min() - rollups.MAX_INTEGRATION_GAP,
+                      group['end_time'].max())
+            for asset_id, group in done.groupby('asset_id')], ignore_index=True))
+        attributed = attribute(done, readings)
+        conn.executemany(
+            'INSERT OR REPLACE INTO batch_energy (batch_id, asset_id, complete, readings, energy_kwh, kwh_per_gallon) '
+            'VALUES (?, ?, 1, ?, ?, ?)',
+            attributed.astype(object).where(attributed.notna(), None).itertuples(index=False, name=None))
+    conn.executemany('INSERT OR IGNORE INTO batch_energy (batch_id, asset_id, complete) VALUES (?, ?, 0)',
+                     ((int(row.batch_id), int(row.asset_id)) for row in batches[~ready].itertuples()))
+
+    if not new.empty:
+        data_access.set_watermark(conn, STATE_NAME, int(new['batch_id'].max()))
+    return len(done), len(new) == REFRESH_CHUNK_BATCHES
+
+
+def refresh(db_path=None):
+    # Attributes energy to every batch whose readings have arrived; the rest are kept as pending rows
+    db_path = db_path or data_access.DB_PATH
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        total = 0
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                attributed, more = _refresh_chunk(conn, db_path, data_access.get_watermark(conn, STATE_NAME))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            total += attributed
+            if not more:
+                return total
+    finally:
+        conn.close()
+
+
+def load_batch_efficiency(asset_id=None, site=None):
+    # Attributed batches of one asset or a whole site, in batch order
+    sql = ('SELECT b.batch_id, b.asset_id, a.name AS asset_name, b.product_name, b.start_time, b.end_time, '
+           'b.volume_gallons, e.readings, e.energy_kwh, e.kwh_per_gallon '
+           'FROM batches b JOIN batch_energy e ON e.batch_id = b.batch_id AND e.complete = 1 '
+           'JOIN assets a ON a.asset_id = b.asset_id ')
+    if asset_id is not None:
+        return data_access.read_sql(sql + 'WHERE b.asset_id = ? ORDER BY b.batch_id', (int(asset_id),),
+                                    data_access.asset_db(asset_id))
+    return data_access.read_sql(sql + 'WHERE a.site = ? ORDER BY b.batch_id', (site,), data_access.site_db(site))
+
+
+def by_product(efficiency):
+    # Totals per product; kWh per gallon is total energy over total volume, not a mean of batch ratios
+    totals = efficiency.groupby('product_name', observed=True).agg(
+        batches=('batch_id', 'size'),
+        volume_gallons=('volume_gallons', 'sum'),
+        energy_kwh=('energy_kwh', 'sum'),
+        best_kwh_per_gallon=('kwh_per_gallon', 'min'),
+        worst_kwh_per_gallon=('kwh_per_gallon', 'max'),
+    ).reset_index()
+    totals['kwh_per_gallon'] = totals['energy_kwh'] / totals['volume_gallons'].where(totals['volume_gallons'] > 0)
+    return totals[['product_name', 'batches', 'volume_gallons', 'energy_kwh', 'kwh_per_gallon',
+                   'best_kwh_per_gallon', 'worst_kwh_per_gallon']]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Attribute energy_usage to batches and materialize kWh per gallon.')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    args = parser.parse_args()
+
+    migrations.migrate(args.db)
+    started = time.perf_counter()
+    print(f'Attributed energy to {refresh(args.db)} batches in {time.perf_counter() - started:.2f}s')
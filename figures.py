@@ -0,0 +1,118 @@
+# Static matplotlib figures, kept free of Streamlit so the precompute worker can draw them too.
+# matplotlib and seaborn are most of a cold start, so they are imported with the first figure drawn (or by warm_up)
+
+
+def plotting():
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
+
+def warm_up():
+    # Imports the plotting stack and draws one throwaway figure, so fonts and the backend are loaded too
+    plt, _ = plotting()
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [0, 1])
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def draw_utility_summary(utility_data):
+    plt, sns = plotting()
+
+    # Set seaborn style
+    sns.set(style="whitegrid")
+
+    # Metrics to plot
+    metrics = ["total_kwh", "peak_kw", "average_kw", "billing_amount"]
+
+    # Create subplots
+    fig, axes = plt.subplots(len(metrics), 1, figsize=(12, 16), sharex=True)
+
+    # Plot each metric
+    for i, metric in enumerate(metrics):
+        sns.lineplot(data=utility_data, x="billing_period_start", y=metric, hue="site", marker="o", ax=axes[i])
+        axes[i].set_title(f"{metric.replace('_', ' ').title()} Over Time by Site")
+        axes[i].set_ylabel(metric.replace('_', ' ').title())
+        axes[i].set_xlabel("Billing Period Start")
+
+    plt.tight_layout()
+    return fig
+
+
+def draw_asset_volume(asset1_data):
+    plt, _ = plotting()
+    fig1, ax1 = plt.subplots()
+    ax1.bar(asset1_data['batch_id'].astype(str), asset1_data['volume_gallons'], color='skyblue')
+    ax1.set_xlabel("Batch ID")
+    ax1.set_ylabel("Volume (Gallons)")
+    ax1.grid(True)
+    plt.xticks(rotation=45)
+    return fig1
+
+
+def draw_overview_volume(batch_data):
+    plt, _ = plotting()
+    fig1, ax1 = plt.subplots()
+    for asset_name, df in batch_data.groupby('asset_name', sort=False, observed=True):
+        ax1.bar(df['batch_id'].astype(str), df['volume_gallons'], label=asset_name, alpha=0.6)
+    ax1.set_xlabel("Batch ID")
+    ax1.set_ylabel("Volume (Gallons)")
+    ax1.grid(True)
+    ax1.legend()
+    plt.xticks(rotation=45)
+    return fig1
+
+
+# Energy metrics in the order the Energy view charts them: column, label, line colour for single-asset charts
+ENERGY_METRICS = [
+    ('power_kw', 'Power (kW)', None),
+    ('voltage', 'Voltage', 'orange'),
+    ('amperage', 'Amperage', 'green'),
+]
+
+
+def draw_energy(energy_data, series=None):
+    # Static counterpart of the Energy view's charts, one panel per metric and a line per series when given.
+    # Each line is thinned to the figure's pixel width like the interactive charts
+    import downsample
+
+    plt, _ = plotting()
+    fig, axes = plt.subplots(len(ENERGY_METRICS), 1, figsize=(12, 10), sharex=True)
+    groups = energy_data.groupby(series, sort=False, observed=True) if series else [(None, energy_data)]
+    for name, df in groups:
+        for ax, (column, _, color) in zip(axes, ENERGY_METRICS):
+            points = downsample.downsample(df, 'timestamp', column, downsample.pixel_budget(fig))
+            ax.plot(points['timestamp'], points[column], label=name, color=None if series else color)
+    for ax, (_, label, _) in zip(axes, ENERGY_METRICS):
+        ax.set_title(f"{label} Over Time")
+        ax.set_ylabel(label)
+        ax.grid(True)
+        if series:
+            ax.legend()
+    axes[-1].set_xlabel("Timestamp")
+    fig.autofmt_xdate()
+    plt.tight_layout()
+    return fig
+
+
+def draw_alerts(alert_data):
+    # Static counterpart of the Alerts view: one panel per alert type, values against their thresholds
+    plt, _ = plotting()
+    alert_types = list(alert_data['alert_type'].unique())
+    fig, axes = plt.subplots(len(alert_types), 1, figsize=(12, 3 * len(alert_types)), sharex=True, squeeze=False)
+    for ax, alert_type in zip(axes[:, 0], alert_types):
+        subset = alert_data[alert_data['alert_type'] == alert_type]
+        exceeds = subset['value'] > subset['threshold']
+        ax.scatter(subset['timestamp'], subset['value'], color='blue', s=12, label='Alert Value')
+        ax.scatter(subset.loc[exceeds, 'timestamp'], subset.loc[exceeds, 'value'], color='orange', s=30,
+                   label='Exceeds Threshold')
+        ax.scatter(subset['timestamp'], subset['threshold'], color='red', marker='_', s=80, label='Threshold')
+        ax.set_title(alert_type)
+        ax.set_ylabel("Value")
+        ax.grid(True)
+        ax.legend()
+    axes[-1, 0].set_xlabel("Timestamp")
+    fig.autofmt_xdate()
+    plt.tight_layout()
+    return fig
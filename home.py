@@ -0,0 +1,121 @@
+import streamlit as st
+
+
+application_guide_introduction      = "Welcome to Essential Sustainability Visibility! This guide will help you understand how to use the application effectively. Whether you're a new user or need a refresher, this document covers all the essential features and workflows."
+application_guide_part1_title       = "#### **Integrated Data Presentation**"
+application_guide_part1_description = "This application brings together operational metrics like energy, batches, performance issue alerts, utility summary, and baseline performance in a single place."
+application_guide_part2_title       = "#### **Dynamic Data Visualization**"
+application_guide_part2_description = "By combining instrumental data from various sources and analyzing relationships between them, users can get a big picture overview of Sherwin-William's operations."
+application_guide_part3_title       = "#### **Historical Data Comparison**"
+application_guide_part3             = "This application enables comparison of data with data obtained from historical averages to facilitate early detection of divergence from optimal performance."
+application_guide_part4_title       = "#### **Alerting**"
+application_guide_part4             = "Get alerts when operational metrics differ significantly from the baseline average and reduce the time required to recover from operational failures."
+application_usage_guide_1_title     = "#### **Energy**"
+application_usage_guide_1_text      = "Users can get an overview of energy consumption metrics like Power, Voltage, and Ampere for a particular asset in a location."
+application_usage_guide_1_markdown  = """1. Select **Site** (manufacturing location) in the left navigation bar
+2. Select **Name** for the asset
+3. Click on **Energy** radio button \n
+##### Graphs Overview
+* **Power (KwH)** over time - power usage
+* **Voltage** over time - voltage measured
+* **Amperage** over time - amperage reading"""
+
+
+application_usage_guide_2_title    = "#### **Volume**"
+application_usage_guide_2_text     = "Users can get an overview of volume of paint produced by the batch ID"
+application_usage_guide_2_markdown = """1. Select **Site** (manufacturing location) in the left navigation bar
+2. Select **Name** for the asset (or select "overview" to get information about all the assets)
+3. Click on **Volume** radio button \n
+##### Graphs Overview
+* **Volume (in gallons)** per batch (overview) - volume of paint produced in a single batch for all assets in the location
+* **Volume (in gallons)** per batch (per asset) - volume of paint produced in a single batch for a particular location 
+* **Energy per gallon** per product and batch - energy the asset used while each batch ran, divided by its volume
+"""
+
+
+application_usage_guide_3_title    = "#### **Alerts**"
+application_usage_guide_3_text     = "Users can get an overview of reported data versus current threshold limits. This provides visual evidence if an alert is triggered"
+application_usage_guide_3_markdown = """1. Select **Site** (manufacturing location) in the left navigation bar
+2. Select **Name** for the asset (or select "overview" to get information about all the assets)
+3. Click on **Alerts** radio button \n
+##### Graphs Overview
+* **Alerts** per asset - alerts produced per asset"""
+application_usage_guide_4_title    = "#### **Billing Info**"
+application_usage_guide_4_text     = ""
+application_usage_guide_4_markdown = ""
+
+
+application_usage_guide_5_title    = "#### **Comparison**"
+application_usage_guide_5_text     = "Users can compare energy data for any number of assets, from the same or different sites, to analyze performance differences between them"
+application_usage_guide_5_markdown = """1. Click on **Comparison** radio button
+2. Pick the assets in **Compare Assets** in the left navigation bar (at least two; any site, starting from the selected asset)
+3. Select the **Metric** to compare: Power, Voltage or Amperage
+4. Select the **Layout**: **Overlaid** on one chart, or **Small multiples** with a chart per asset
+5. Narrow down the **Time Window**, or drag across the chart to zoom \n
+##### Graphs Overview
+* **Metric** over time (overlaid) - every selected asset as its own line on one shared time axis
+* **Metric** over time (small multiples) - one chart per asset, sharing the time axis and scale
+"""
+
+
+
+application_usage_guide_6_title    = "#### **Billing (Utility Summary)**"
+application_usage_guide_6_text     = "Users can analyze utility summary reports on specific sites and assets"
+application_usage_guide_6_markdown = """1. Select **Billing Info** (manufacturing location) at the top of the left navigation bar
+2. Narrow down **Billing Sites** and **Billing Periods** in the left navigation bar \n
+##### Graphs Overview
+* **Total Kw/H** over time - total energy usage over time for all currently available sites
+* **Peak Kw/H** over time - highest recorded energy usage for all currently available sides
+* **Average Kw/H** over time - average energy usage over time for all currently available sites 
+* **Billing Amount** over time - billing amounts over time for all currently available sites
+* **Period over Period** - change in usage, amount, cost per kWh and peak demand since the previous bill
+* **Billed vs Metered kWh** - billed usage next to the usage metered by the site's assets
+"""
+
+
+def setup_home():
+    st.title("_Sustainability Visibility_ :seedling:")
+    st.subheader("Application Overview", divider="gray")
+    st.text(application_guide_introduction)
+
+    st.markdown(application_guide_part1_title)
+    st.text(application_guide_part1_description)
+
+    st.markdown(application_guide_part2_title)
+    st.text(application_guide_part2_description)
+
+    st.markdown(application_guide_part3_title)
+    st.text(application_guide_part3)
+
+    st.markdown(application_guide_part4_title)
+    st.text(application_guide_part4)
+
+    st.subheader("Application Guide", divider="gray")
+
+    st.markdown(application_usage_guide_1_title)
+    st.markdown(application_usage_guide_1_text)
+    st.markdown(application_usage_guide_1_markdown)
+
+    st.divider()
+
+    st.markdown(application_usage_guide_2_title)
+    st.markdown(application_usage_guide_2_text)
+    st.markdown(application_usage_guide_2_markdown)
+
+    st.divider()
+
+    st.markdown(application_usage_guide_3_title)
+    st.markdown(application_usage_guide_3_text)
+    st.markdown(application_usage_guide_3_markdown)
+
+    st.divider()
+
+    st.markdown(application_usage_guide_5_title)
+    st.markdown(application_usage_guide_5_text)
+    st.markdown(application_usage_guide_5_markdown)
+
+    st.divider()
+
+    st.markdown(application_usage_guide_6_title)
+    st.markdown(application_usage_guide_6_text)
+    st.markdown(application_usage_guide_6_markdown)
@@ -0,0 +1,221 @@
+import argparse
+import csv
+import io
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import data_access
+import migrations
+import rollups
+
+
+# Column -> (converter, required) for every table the pipeline can append to; ids are assigned by SQLite
+TABLE_SCHEMAS = {
+    'energy_usage': {
+        'asset_id': ('int', True),
+        'timestamp': ('datetime', True),
+        'power_kw': ('float', False),
+        'voltage': ('float', False),
+        'amperage': ('float', False),
+    },
+    'alerts': {
+        'asset_id': ('int', True),
+        'timestamp': ('datetime', True),
+        'alert_type': ('text', False),
+        'value': ('float', False),
+        'threshold': ('float', False),
+    },
+    'batches': {
+        'asset_id': ('int', True),
+        'start_time': ('datetime', True),
+        'end_time': ('datetime', True),
+        'product_name': ('text', False),
+        'volume_gallons': ('float', False),
+    },
+}
+
+BATCH_SIZE = 5000
+QUEUE_BATCHES = 8
+PROGRESS_SECONDS = 5
+MAX_REPORTED_ERRORS = 10
+
+
+class RowError(ValueError):
+    pass
+
+
+def _to_datetime(value):
+    # Stored as 'YYYY-MM-DD HH:MM:SS' like the rest of the database; canonical strings pass through untouched
+    if isinstance(value, str) and len(value) == 19 and value[10] == ' ':
+        datetime.fromisoformat(value)
+        return value
+    return datetime.fromisoformat(str(value)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+CONVERTERS = {
+    'int': int,
+    'float': float,
+    'text': str,
+    'datetime': _to_datetime,
+}
+
+
+def read_rows(stream, fmt):
+    # Lazily yields one dict per input record so arbitrarily large inputs stream through
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield RowError(f'line {line_number}: invalid JSON ({exc.msg})')
+
+
+def validate_rows(rows, table, known_assets):
+    # Yields (tuple_in_column_order, None) for good rows and (None, error) for rejected ones
+    schema = TABLE_SCHEMAS[table]
+    columns = [(name, CONVERTERS[kind], required) for name, (kind, required) in schema.items()]
+
+    for row in rows:
+        if isinstance(row, RowError):
+            yield None, row
+            continue
+        try:
+            values = []
+            for name, convert, required in columns:
+                value = row.get(name)
+                if value is None or value == '':
+                    if required:
+                        raise RowError(f'missing {name}')
+                    values.append(None)
+                else:
+                    values.append(convert(value))
+        except (TypeError, ValueError) as exc:
+            yield None, RowError(f'{row!r}: {exc}')
+            continue
+
+        if values[0] not in known_assets:
+            yield None, RowError(f'{row!r}: unknown asset_id {values[0]}')
+            continue
+        yield tuple(values), None
+
+
+def batched(validated, batch_size, stats):
+    batch = []
+    for values, error in validated:
+        if error is not None:
+            stats['rejected'] += 1
+            if stats['rejected'] <= MAX_REPORTED_ERRORS:
+                print(f'rejected: {error}', file=sys.stderr)
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _writer(db_path, table, pending, stats, failure):
+    columns = list(TABLE_SCHEMAS[table])
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA synchronous=NORMAL')
+    try:
+        while True:
+            batch = pending.get()
+            if batch is None:
+                return
+            # One short transaction per batch keeps the write lock brief; WAL readers are never blocked
+            with conn:
+                conn.executemany(sql, batch)
+            stats['inserted'] += len(batch)
+    except BaseException as exc:
+        failure.append(exc)
+        # Keep draining so the reader never blocks forever on a full queue
+        while pending.get() is not None:
+            pass
+    finally:
+        conn.close()
+
+
+def ingest(stream, table, fmt='jsonl', db_path=None, batch_size=BATCH_SIZE, progress=None):
+    # Parsing/validation and SQLite writes run on separate threads joined by a bounded queue:
+    # when the writer falls behind, put() blocks and the reader stops pulling input (back-pressure)
+    db_path = db_path or data_access.DB_PATH
+    migrations.migrate(db_path)
+
+    conn = sqlite3.connect(db_path)
+    known_assets = {asset_id for asset_id, in conn.execute('SELECT asset_id FROM assets')}
+    conn.close()
+
+    stats = {'inserted': 0, 'rejected': 0}
+    failure = []
+    pending = queue.Queue(maxsize=QUEUE_BATCHES)
+    writer = threading.Thread(target=_writer, args=(db_path, table, pending, stats, failure), daemon=True)
+
+    started = last_report = time.perf_counter()
+    writer.start()
+    try:
+        for batch in batched(validate_rows(read_rows(stream, fmt), table, known_assets), batch_size, stats):
+            if failure:
+                break
+            pending.put(batch)
+            now = time.perf_counter()
+            if progress and now - last_report >= PROGRESS_SECONDS:
+                progress(stats, now - started)
+                last_report = now
+    finally:
+        pending.put(None)
+        writer.join()
+
+    if failure:
+        raise failure[0]
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_second'] = stats['inserted'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def _print_progress(stats, elapsed):
+    print(f"{stats['inserted']} rows in {elapsed:.1f}s ({stats['inserted'] / elapsed:,.0f} rows/sec), "
+          f"{stats['rejected']} rejected", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-append meter readings, alerts or batches to the database.')
+    parser.add_argument('table', choices=sorted(TABLE_SCHEMAS))
+    parser.add_argument('inputs', nargs='*', default=['-'], help="JSONL/CSV files, or '-' for stdin (default)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: from file extension, jsonl for stdin)')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--refresh-rollups', action='store_true', help='fold new energy_usage rows into the rollups afterwards')
+    args = parser.parse_args()
+
+    totals = {'inserted': 0, 'rejected': 0, 'seconds': 0.0}
+    for path in args.inputs:
+        fmt = args.format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        else:
+            stream = open(path, encoding='utf-8', newline='')
+        with stream:
+            stats = ingest(stream, args.table, fmt, args.db, args.batch_size, progress=_print_progress)
+        for key in totals:
+            totals[key] += stats[key]
+
+    rate = totals['inserted'] / totals['seconds'] if totals['seconds'] else 0.0
+    print(f"Inserted {totals['inserted']} rows into {args.table} ({rate:,.0f} rows/sec), "
+          f"rejected {totals['rejected']}")
+
+    if args.refresh_rollups and args.table == 'energy_usage':
+        print(f'Rolled up {rollups.refresh(args.db)} new energy_usage rows')
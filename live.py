@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_access
+
+
+# Live views poll every REFRESH_SECONDS for rows written since they last looked and keep the newest BUFFER_ROWS
+# of each asset in memory. A tick reads at most MAX_DELTA_ROWS; a view that fell further behind catches up over
+# the next ticks
+REFRESH_SECONDS = int(os.environ.get('SUSTAINABILITY_LIVE_INTERVAL', '5'))
+BUFFER_ROWS = 2000
+MAX_DELTA_ROWS = 50_000
+
+# Tables a live view can follow, and the id column their watermark is on. Ids are assigned on insert, so
+# everything written since a watermark has a larger id whatever its timestamp
+ID_COLUMNS = {'energy_usage': 'usage_id', 'alerts': 'alert_id'}
+
+
+class RingBuffer:
+    # Newest rows of one asset in fixed-size columns; appending overwrites the oldest rows, so memory and the
+    # cost of an append stay bounded however long the view is left open
+    def __init__(self, capacity, dtypes):
+        self.capacity = capacity
+        self._columns = {column: np.empty(capacity, dtype) for column, dtype in dtypes.items()}
+        self._appended = 0
+
+    def __len__(self):
+        return min(self._appended, self.capacity)
+
+    def append(self, frame):
+        frame = frame.tail(self.capacity)
+        positions = (self._appended + np.arange(len(frame))) % self.capacity
+        for column, values in self._columns.items():
+            values[positions] = frame[column].to_numpy()
+        self._appended += len(frame)
+
+    def frame(self):
+        # Oldest first, in the order the rows were appended
+        positions = (self._appended - len(self) + np.arange(len(self))) % self.capacity
+        return pd.DataFrame({column: values[positions] for column, values in self._columns.items()})
+
+
+class LiveFeed:
+    # One session's live rows of a table: a ring buffer and a watermark per asset followed
+    def __init__(self, table, capacity=BUFFER_ROWS):
+        self.table = table
+        self.id_column = ID_COLUMNS[table]
+        self.capacity = capacity
+        self._buffers = {}
+        self._watermarks = {}
+        # Database versions seen by the last poll; a tick on an unchanged database queries nothing
+        self._versions = {}
+
+    def _append(self, asset_id, rows):
+        if rows.empty:
+            return
+        buffer = self._buffers.get(asset_id)
+        if buffer is None:
+            # Categories are kept as their values; the frame is typed again when read back
+            buffer = self._buffers[asset_id] = RingBuffer(
+                self.capacity, {column: rows[column].to_numpy().dtype for column in rows.columns})
+        buffer.append(rows)
+
+    def _follow(self, asset_ids, db_path):
+        # Starts each new asset from its newest rows; history before them is the non-live view's job
+        for asset_id in asset_ids:
+            if asset_id not in self._watermarks:
+                rows, self._watermarks[asset_id] = data_access.load_latest(
+                    self.table, self.id_column, asset_id, self.capacity, db_path)
+                self._append(asset_id, rows)
+
+    def poll(self, asset_ids):
+        # Appends what was written since each asset's watermark; returns the number of new rows
+        new_rows = 0
+        groups = {}
+        for asset_id in asset_ids:
+            groups.setdefault(data_access.asset_db(asset_id), []).append(asset_id)
+        for db_path, ids in groups.items():
+            version = data_access.get_pool(db_path).data_version()
+            unchanged = self._versions.get(db_path) == version and all(asset_id in self._watermarks for asset_id in ids)
+            self._versions[db_path] = version
+            self._follow(ids, db_path)
+            if unchanged:
+                continue
+
+            # One range scan from the furthest-behind watermark covers every asset of the database
+            rows = data_access.load_since(self.table, self.id_column, ids, min(self._watermarks[i] for i in ids),
+                                          MAX_DELTA_ROWS, db_path)
+            if rows.empty:
+                continue
+            for asset_id, group in rows.groupby('asset_id', sort=False):
+                fresh = group[group[self.id_column] > self._watermarks[asset_id]]
+                self._append(asset_id, fresh.sort_values('timestamp', kind='stable'))
+                new_rows += len(fresh)
+            # The scan saw every row of these assets up to its last id, including for assets that had none
+            last = int(rows[self.id_column].max())
+            for asset_id in ids:
+                self._watermarks[asset_id] = max(self._watermarks[asset_id], last)
+            # A capped scan leaves the rest for the next tick, which must not be skipped
+            if len(rows) == MAX_DELTA_ROWS:
+                self._versions.pop(db_path)
+        return new_rows
+
+    def frame(self, asset_ids):
+        # Buffered rows of the assets, sorted by asset and timestamp like the loaders' frames
+        frames = [self._buffers[asset_id].frame() for asset_id in asset_ids if asset_id in self._buffers]
+        if not frames:
+            return pd.DataFrame()
+        frame = pd.concat(frames, ignore_index=True)
+        return data_access.typed(frame.sort_values(['asset_id', 'timestamp'], kind='stable', ignore_index=True))
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import benchmark
+
+
+def _latency_summary(samples):
+    samples = np.asarray(samples) * 1000
+    if len(samples) == 0:
+        return {'samples': 0}
+    return {
+        'samples': len(samples),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'max_ms': round(float(samples.max()), 3),
+    }
+
+
+def run(db_path, sessions=20, requests=10, views=benchmark.VIEWS, site=None, asset_id=None, warm=False,
+        think_time=0.0):
+    # N simulated sessions, each a thread with its own session id, working through the same views at once.
+    # Every request is one view's fetch and render, admitted through the same gate as a dashboard rerun
+    os.environ['SUSTAINABILITY_DB'] = db_path
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    import matplotlib.pyplot as plt
+    import streamlit.config
+    import streamlit.logger
+
+    streamlit.logger.set_log_level('error')
+    streamlit.config.on_config_parsed(lambda: streamlit.logger.set_log_level('error'))
+
+    import admission
+    import asset_registry
+    import data_access
+    import render_cache
+
+    registry = asset_registry.load_registry()
+    site = site or next(iter(registry.sites))
+    asset_id = asset_id or registry.site_assets(site)[0]
+    phases = benchmark._view_phases(site, asset_id)
+
+    scratch = tempfile.mkdtemp(prefix='render_cache_')
+    render_cache.CACHE_DIR = scratch
+    data_access.clear_cache()
+    if warm:
+        for view in views:
+            fetch, render = phases[view]
+            render(fetch())
+
+    latencies = {view: [] for view in views}
+    overloaded = []
+    errors = []
+    session_stats = []
+    record_lock = threading.Lock()
+    ready = threading.Barrier(sessions)
+
+    def session(index):
+        session_id = f'load-test-{index}'
+        data_access.bind_session(session_id)
+        ready.wait()
+        for request in range(requests):
+            # Sessions start on different views, so identical requests overlap without all arriving in lockstep
+            view = views[(index + request) % len(views)]
+            fetch, render = phases[view]
+            started = time.perf_counter()
+            try:
+                with admission.admit(session_id):
+                    render(fetch())
+            except admission.Overloaded:
+                with record_lock:
+                    overloaded.append(view)
+                continue
+            except Exception as exc:
+                with record_lock:
+                    errors.append(f'{view}: {exc!r}')
+                continue
+            elapsed = time.perf_counter() - started
+            with record_lock:
+                latencies[view].append(elapsed)
+            if think_time:
+                time.sleep(think_time)
+        with record_lock:
+            session_stats.append(data_access.cache_stats(session_id))
+
+    threads = [threading.Thread(target=session, args=(index,), name=f'session-{index}') for index in range(sessions)]
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        elapsed = time.perf_counter() - started
+        plt.close('all')
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    completed = [sample for samples in latencies.values() for sample in samples]
+    return {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'db': os.path.abspath(db_path),
+        'site': site,
+        'asset_id': asset_id,
+        'mode': 'warm' if warm else 'cold',
+        'sessions': sessions,
+        'requests_per_session': requests,
+        'max_active_reruns': admission.MAX_ACTIVE_RERUNS,
+        'wall_s': round(elapsed, 3),
+        'completed': len(completed),
+        'overloaded': len(overloaded),
+        'errors': errors,
+        'throughput_rps': round(len(completed) / elapsed, 3) if elapsed else None,
+        'latency': _latency_summary(completed),
+        'views': {view: _latency_summary(samples) for view, samples in latencies.items()},
+        'cache': {key: sum(stats[key] for stats in session_stats) for key in ('hits', 'misses', 'shared')},
+    }
+
+
+def _print_table(result, out):
+    latency = result['latency']
+    print(f"{result['mode']} load test on {result['db']}: {result['sessions']} sessions x "
+          f"{result['requests_per_session']} requests, {result['max_active_reruns']} active reruns at most", file=out)
+    print(f"{result['completed']} completed, {result['overloaded']} turned away, {len(result['errors'])} errors "
+          f"in {result['wall_s']:.1f}s = {result['throughput_rps']:.1f} requests/s", file=out)
+    if latency['samples']:
+        print(f"latency p50 {latency['p50_ms']:.1f} ms, p95 {latency['p95_ms']:.1f} ms, "
+              f"p99 {latency['p99_ms']:.1f} ms, max {latency['max_ms']:.1f} ms", file=out)
+    cache = result['cache']
+    print(f"query cache: {cache['hits']} hits, {cache['misses']} misses, {cache['shared']} shared", file=out)
+    print(f"{'view':<16}{'p50':>10}{'p95':>10}{'p99':>10}", file=out)
+    for view, summary in result['views'].items():
+        if summary['samples']:
+            print(f"{view:<16}{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}",
+                  file=out)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate concurrent dashboard sessions and report throughput '
+                                                 'and tail latency.')
+    parser.add_argument('--db', default=os.environ.get('SUSTAINABILITY_DB', 'sustainability_data.db'))
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=10, help='views each session opens (default: %(default)s)')
+    parser.add_argument('--views', nargs='+', choices=benchmark.VIEWS, default=benchmark.VIEWS)
+    parser.add_argument('--site')
+    parser.add_argument('--asset-id', type=int)
+    parser.add_argument('--warm', action='store_true', help='load every view once before the sessions start')
+    parser.add_argument('--think-time', type=float, default=0.0, help='seconds each session pauses between views')
+    parser.add_argument('--output', help='append the JSON result as one line to this file')
+    args = parser.parse_args()
+
+    result = run(args.db, args.sessions, args.requests, args.views, args.site, args.asset_id, args.warm,
+                 args.think_time)
+    _print_table(result, sys.stderr)
+    if args.output:
+        with open(args.output, 'a') as out:
+            out.write(json.dumps(result) + '\n')
+    else:
+        print(json.dumps(result, indent=2))
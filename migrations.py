@@ -0,0 +1,146 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+
+import data_access
+
+
+# Each migration is applied once, in order, and recorded in PRAGMA user_version
+MIGRATIONS = [
+    (1, "Secondary indexes for the dashboard's time-series and site lookups", [
+        'CREATE INDEX IF NOT EXISTS idx_energy_usage_asset_ts ON energy_usage (asset_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_alerts_asset_ts ON alerts (asset_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_batches_asset_batch ON batches (asset_id, batch_id)',
+        'CREATE INDEX IF NOT EXISTS idx_assets_site ON assets (site)',
+        'CREATE INDEX IF NOT EXISTS idx_utility_summary_site ON utility_summary (site, billing_period_start)',
+    ]),
+    (2, 'Hourly/daily/monthly energy_usage rollups, and the watermarks of every incremental job', [
+        *[f'''CREATE TABLE IF NOT EXISTS energy_rollup_{level} (
+            asset_id INTEGER NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            readings INTEGER NOT NULL,
+            power_kw_count INTEGER NOT NULL, power_kw_sum REAL, power_kw_min REAL, power_kw_max REAL,
+            voltage_count INTEGER NOT NULL, voltage_sum REAL, voltage_min REAL, voltage_max REAL,
+            amperage_count INTEGER NOT NULL, amperage_sum REAL, amperage_min REAL, amperage_max REAL,
+            energy_kwh REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (asset_id, bucket_start),
+            FOREIGN KEY (asset_id) REFERENCES assets(asset_id)
+        )''' for level in ('hourly', 'daily', 'monthly')],
+        '''CREATE TABLE IF NOT EXISTS watermarks (
+            name TEXT PRIMARY KEY,
+            high_water_mark INTEGER NOT NULL
+        )''',
+    ]),
+    (3, 'Energy attributed to each batch, materialized incrementally by efficiency.refresh', [
+        '''CREATE TABLE IF NOT EXISTS batch_energy (
+            batch_id INTEGER PRIMARY KEY,
+            asset_id INTEGER NOT NULL,
+            complete INTEGER NOT NULL,
+            readings INTEGER,
+            energy_kwh REAL,
+            kwh_per_gallon REAL,
+            FOREIGN KEY (batch_id) REFERENCES batches(batch_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_batch_energy_asset ON batch_energy (asset_id, batch_id)',
+        'CREATE INDEX IF NOT EXISTS idx_batch_energy_pending ON batch_energy (batch_id) WHERE complete = 0',
+    ]),
+]
+
+# Representative dashboard queries used to prove the indexes are picked up
+REPORT_QUERIES = [
+    ('Site assets', 'SELECT * FROM assets WHERE site = ?', ('Houston',)),
+    ('Asset energy', 'SELECT * FROM energy_usage WHERE asset_id = ? ORDER BY timestamp', (1,)),
+    ('Asset batches', 'SELECT * FROM batches WHERE asset_id = ? ORDER BY batch_id', (1,)),
+    ('Asset alerts', 'SELECT * FROM alerts WHERE asset_id = ? ORDER BY timestamp', (1,)),
+    ('Site energy', 'SELECT e.*, a.name AS asset_name FROM energy_usage e '
+                    'JOIN assets a ON a.asset_id = e.asset_id '
+                    'WHERE a.site = ? ORDER BY e.asset_id, e.timestamp', ('Houston',)),
+    ('Site billing', 'SELECT * FROM utility_summary WHERE site = ? ORDER BY billing_period_start', ('Houston',)),
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(db_path=None):
+    # Returns the list of migration versions applied by this call
+    db_path = db_path or data_access.DB_PATH
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        current = schema_version(conn)
+        applied = []
+
+        for version, _, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            with conn:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version}')
+            applied.append(version)
+
+        if applied:
+            conn.execute('ANALYZE')
+        else:
+            conn.execute('PRAGMA optimize')
+        return applied
+    finally:
+        conn.close()
+
+
+def query_plans(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        plans = {}
+        for label, sql, params in REPORT_QUERIES:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            plans[label] = [row[-1] for row in rows]
+        return plans
+    finally:
+        conn.close()
+
+
+def plan_report(db_path=None):
+    # Works on a scratch copy so the report never mutates the live database
+    db_path = db_path or data_access.DB_PATH
+    with tempfile.TemporaryDirectory() as scratch:
+        copy_path = os.path.join(scratch, 'plan_report.db')
+        conn = sqlite3.connect(copy_path)
+
+        # The backup API also picks up pages still sitting in the WAL file
+        source = sqlite3.connect(db_path)
+        source.backup(conn)
+        source.close()
+
+        for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+            conn.execute(f'DROP INDEX {name}')
+        conn.execute('PRAGMA user_version = 0')
+        conn.commit()
+        conn.close()
+
+        before = query_plans(copy_path)
+        migrate(copy_path)
+        after = query_plans(copy_path)
+
+    lines = []
+    for label, _, _ in REPORT_QUERIES:
+        lines.append(f'== {label}')
+        lines.extend(f'  before: {step}' for step in before[label])
+        lines.extend(f'  after:  {step}' for step in after[label])
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply schema migrations to the sustainability database.')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--report', action='store_true', help='print before/after query plans instead of migrating')
+    args = parser.parse_args()
+
+    if args.report:
+        print(plan_report(args.db))
+    else:
+        applied = migrate(args.db)
+        print(f'Applied migrations: {applied}' if applied else 'Schema is up to date')
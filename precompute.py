@@ -0,0 +1,225 @@
+import argparse
+import atexit
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import alert_engine
+import billing
+import data_access
+import efficiency
+import figures
+import migrations
+import render_cache
+import rollups
+import tracing
+
+
+# Site overviews are precomputed into snapshots next to their database, one file per dataset and site:
+#   <db>_snapshots/<dataset>/<site>.parquet
+# plus a state file recording when the worker last looked at the database and what it saw
+DATASETS = ['energy', 'volume', 'alerts', 'billing']
+DEFAULT_INTERVAL_SECONDS = 300
+STATE_FILE = '_state.json'
+# Snapshots are served while the worker has checked the database within this many of its intervals
+STALE_AFTER_INTERVALS = 3
+# Set to a number of seconds to have the dashboard start a worker on that schedule
+WORKER_INTERVAL = int(os.environ.get('SUSTAINABILITY_PRECOMPUTE_INTERVAL', '0') or 0)
+
+# Chart names the dashboard uses for these figures, so a worker-drawn PNG is the one the app looks up
+FIGURES = {
+    'volume': ('volume_overview', figures.draw_overview_volume),
+    'billing': ('utility_summary', figures.draw_utility_summary),
+}
+
+
+def snapshot_dir(db_path):
+    return os.path.splitext(os.path.abspath(db_path))[0] + '_snapshots'
+
+
+def snapshot_path(root, dataset, site):
+    # Billing covers every site and is stored once
+    return os.path.join(root, dataset, f"{quote(site, safe='') if site is not None else '_all'}.parquet")
+
+
+def read_state(root):
+    try:
+        with open(os.path.join(root, STATE_FILE)) as state:
+            return json.load(state)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    # Written beside the final name then renamed, so the dashboard never reads a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+    write(staging)
+    os.replace(staging, path)
+
+
+def write_state(root, state):
+    def write(staging):
+        with open(staging, 'w') as out:
+            json.dump(state, out)
+    _write_atomic(os.path.join(root, STATE_FILE), write)
+
+
+def write_snapshot(root, dataset, site, frame, generated_at, resolution=None):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}),
+                b'generated_at': str(generated_at).encode(), b'resolution': (resolution or '').encode()}
+    table = table.replace_schema_metadata(metadata)
+    _write_atomic(snapshot_path(root, dataset, site), lambda staging: pq.write_table(table, staging))
+
+
+class Snapshot:
+    def __init__(self, frame, generated_at, checked_at, resolution):
+        self.frame = frame
+        self.generated_at = generated_at
+        self.checked_at = checked_at
+        self.resolution = resolution
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def load_snapshot(dataset, site=None, db_path=None):
+    # Latest precomputed frame, or None when there is none or the worker has stopped checking the database.
+    # Snapshots sit next to the site's database; cross-site ones only exist while the sites share one
+    if db_path is None:
+        if site is None and len(data_access.databases()) > 1:
+            return None
+        db_path = data_access.site_db(site) if site is not None else data_access.DB_PATH
+    root = snapshot_dir(db_path)
+    state = read_state(root)
+    if state is None or time.time() - state['checked_at'] > STALE_AFTER_INTERVALS * state['interval']:
+        return None
+
+    path = snapshot_path(root, dataset, site)
+    try:
+        version = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with tracing.span('load_snapshot', 'query'):
+        with _snapshots_lock:
+            cached = _snapshots.get(path)
+            if cached is None or cached[0] != version:
+                table = pq.read_table(path)
+                metadata = table.schema.metadata
+                cached = _snapshots[path] = (version, data_access.typed(table.to_pandas()),
+                                             pd.Timestamp(metadata[b'generated_at'].decode()),
+                                             metadata[b'resolution'].decode() or None)
+        _, frame, generated_at, resolution = cached
+    return Snapshot(frame.copy(), generated_at, pd.Timestamp.fromtimestamp(state['checked_at']).floor('s'), resolution)
+
+
+def energy_overview(site):
+    # What the site's Energy view loads for 'All time' before any zoom
+    cover = rollups.coverage(site=site)
+    resolution = rollups.choose_resolution(cover['first'], cover['latest'], cover=cover)
+    if resolution == 'raw':
+        return data_access.load_site_energy_usage(site), resolution
+    return rollups.load_energy_rollup(resolution, site=site), resolution
+
+
+def _compute(dataset, site, db_path):
+    if dataset == 'energy':
+        return energy_overview(site)
+    if dataset == 'volume':
+        return data_access.load_site_batches(site), None
+    if dataset == 'alerts':
+        return data_access.load_site_alerts(site), None
+    return billing.load_bills(db_path=db_path), None
+
+
+def precompute(db_path=None, sites=None, datasets=DATASETS):
+    # One pass over every site's overview datasets; returns the snapshots written
+    db_path = db_path or data_access.DB_PATH
+    root = snapshot_dir(db_path)
+    if sites is None:
+        sites = sorted(data_access.read_sql('SELECT DISTINCT site FROM assets', db_path=db_path)['site'].astype(str))
+    generated_at = pd.Timestamp.now().floor('s')
+    written = 0
+    for dataset in datasets:
+        # Billing covers every site, so with sharded sites it is merged from the shards when read instead
+        if dataset == 'billing' and len(data_access.databases()) > 1:
+            continue
+        for site in ([None] if dataset == 'billing' else sites):
+            frame, resolution = _compute(dataset, site, db_path)
+            write_snapshot(root, dataset, site, frame, generated_at, resolution)
+            written += 1
+            if dataset in FIGURES and not frame.empty:
+                # Drawn from the frame as the dashboard will read it back, so both hash it the same way
+                name, draw = FIGURES[dataset]
+                frame = data_access.typed(pq.read_table(snapshot_path(root, dataset, site)).to_pandas())
+                render_cache.cached_png(render_cache.data_hash(frame, name), lambda: draw(frame))
+    return written
+
+
+def run(db_path=None, interval=DEFAULT_INTERVAL_SECONDS, sites=None, datasets=DATASETS, once=False):
+    db_path = db_path or data_access.DB_PATH
+    root = snapshot_dir(db_path)
+    migrations.migrate(db_path)
+    while True:
+        started = time.time()
+        # Folding in new readings first means an unchanged signature really is nothing new to show
+        rollups.refresh(db_path)
+        alert_engine.evaluate(db_path)
+        efficiency.refresh(db_path)
+        data_access.clear_cache()
+
+        signature = data_access.db_signature(db_path)
+        state = read_state(root) or {}
+        if state.get('signature') != signature or state.get('sites') != sites or state.get('datasets') != datasets:
+            written = precompute(db_path, sites, datasets)
+            print(f'Precomputed {written} snapshots in {time.time() - started:.1f}s', flush=True)
+            state = {'signature': signature, 'sites': sites, 'datasets': datasets, 'generated_at': started}
+        state.update(checked_at=time.time(), interval=interval)
+        write_state(root, state)
+
+        if once:
+            return
+        time.sleep(max(0.0, interval - (time.time() - started)))
+
+
+def start_worker(db_path=None, interval=WORKER_INTERVAL):
+    # The worker runs as its own process so precomputation never competes with reruns for the GIL. It leads its
+    # own process group, and the whole group is stopped with the app
+    db_path = db_path or data_access.DB_PATH
+    worker = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--db', db_path, '--interval', str(interval)],
+                              start_new_session=True)
+    atexit.register(stop_worker, worker)
+    return worker
+
+
+def stop_worker(worker):
+    try:
+        os.killpg(worker.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    worker.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute site overview snapshots for the dashboard.')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL_SECONDS,
+                        help='seconds between checks for new data (default: %(default)s)')
+    parser.add_argument('--sites', nargs='+', help='only these sites (default: every site)')
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=DATASETS)
+    parser.add_argument('--once', action='store_true', help='run a single pass, e.g. from cron')
+    args = parser.parse_args()
+
+    data_access.DB_PATH = args.db
+    run(args.db, args.interval, args.sites, args.datasets, args.once)
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+import pandas as pd
+
+import data_access
+
+
+# Series remembered per session, and how far the buffered span may outgrow the visible one before it is dropped
+MAX_BUFFERED_SERIES = 8
+MAX_SPAN_RATIO = 4
+
+
+class RangeBuffer:
+    # Per-session memory of the last time range loaded for each series and resolution. Panning or widening
+    # a chart only fetches the edges that aren't buffered yet; zooming into a buffered range fetches nothing
+    def __init__(self, max_series=MAX_BUFFERED_SERIES):
+        self.max_series = max_series
+        self._entries = OrderedDict()
+
+    def load(self, key, start, end, fetch):
+        # fetch(start, end) returns typed rows with timestamp in [start, end]; returns the rows for [start, end]
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            lo, hi, frame = entry
+            # Growing the buffer is only worth it while it stays close to what is actually on screen
+            contained = lo <= start and end <= hi
+            too_wide = (max(hi, end) - min(lo, start)) > MAX_SPAN_RATIO * (end - start)
+            if start > hi or end < lo or (too_wide and not contained):
+                entry = None
+
+        if entry is None:
+            lo, hi, frame = start, end, fetch(start, end)
+        else:
+            parts = [frame]
+            if start < lo:
+                parts.append(fetch(start, lo))
+            if end > hi:
+                parts.append(fetch(hi, end))
+            if len(parts) > 1:
+                # Edge fetches share their boundary timestamp with the buffered rows
+                frame = pd.concat(parts, ignore_index=True)
+                frame = frame.drop_duplicates(['asset_id', 'timestamp']).sort_values(['asset_id', 'timestamp'])
+                frame = data_access.typed(frame.reset_index(drop=True))
+            lo, hi = min(lo, start), max(hi, end)
+
+        self._entries[key] = (lo, hi, frame)
+        while len(self._entries) > self.max_series:
+            self._entries.popitem(last=False)
+
+        visible = frame['timestamp'].between(start, end)
+        return frame[visible].reset_index(drop=True)
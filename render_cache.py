@@ -0,0 +1,115 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import tracing
+
+
+CACHE_DIR = '.render_cache'
+MAX_CACHED_FIGURES = 500
+
+# Same output st.pyplot would produce for the figure
+RENDER_DPI = 200
+# Modules whose code decides how a figure looks; a change to either redraws every cached figure
+DRAWING_MODULES = ['figures.py', 'downsample.py']
+
+# Figures are drawn on a bounded pool rather than on every session's script thread. pyplot keeps
+# process-wide state, so one worker; sessions queue for it instead of contending inside matplotlib
+RENDER_WORKERS = 1
+_render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='render')
+# Draws queued or running, so concurrent sessions asking for the same figure share one draw
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def data_hash(frame, *extra):
+    # Content hash of the rows behind a chart plus anything else that changes how it is drawn
+    digest = hashlib.sha256()
+    digest.update(repr(list(frame.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    for part in extra:
+        digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+def _drawing_version():
+    digest = hashlib.sha256(repr(RENDER_DPI).encode())
+    for name in DRAWING_MODULES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+# Part of every cached PNG's file name, so images drawn by older code are never served (and age out)
+DRAWING_VERSION = _drawing_version()
+
+
+def figure_png(fig):
+    # pyplot is already loaded by whatever drew the figure
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=RENDER_DPI, bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _prune():
+    entries = [entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.png')]
+    if len(entries) <= MAX_CACHED_FIGURES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - MAX_CACHED_FIGURES]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_png(key, render):
+    # render() builds the matplotlib figure; it only runs when no session has drawn this key before
+    key = f'{key}-{DRAWING_VERSION}'
+    path = os.path.join(CACHE_DIR, f'{key}.png')
+    try:
+        with open(path, 'rb') as cached:
+            return cached.read()
+    except FileNotFoundError:
+        pass
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        submitted = future is None
+        if submitted:
+            future = _inflight[key] = _render_pool.submit(_draw, path, render, tracing.current())
+    if submitted:
+        # Outside the lock: the callback runs right here if the draw has already finished
+        future.add_done_callback(lambda _: _forget(key))
+    return future.result()
+
+
+def _forget(key):
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+
+def _draw(path, render, trace):
+    # Runs on the render pool, recording into the trace of the rerun that queued it
+    tracing.bind(trace)
+    try:
+        with tracing.span('draw_figure', 'render'):
+            png = figure_png(render())
+    finally:
+        tracing.bind(None)
+
+    # Write-then-rename so concurrent sessions never read a half-written file
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    partial = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(partial, 'wb') as out:
+        out.write(png)
+    os.replace(partial, path)
+    _prune()
+    return png
@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import quote
+
+import pandas as pd
+
+import alert_engine
+import asset_registry
+import billing
+import data_access
+import efficiency
+import figures
+import migrations
+import render_cache
+import rollups
+
+
+# Headless reports of what the Energy, Volume, Alerts and Billing views show, one per site and one per asset:
+#   <out>/<site>/<report>.pdf   the views' figures, a page each
+#   <out>/<site>/<report>.zip   the frames behind them as CSV
+# <out>/manifest.json records the data hash each report was built from, so an unchanged one is skipped
+DEFAULT_DAYS = 7
+FORMATS = ['pdf', 'csv']
+MANIFEST = 'manifest.json'
+# Bumped whenever the layout changes, so every report is rebuilt once; changes to the figures' code are picked up
+# through render_cache.DRAWING_VERSION
+REPORT_VERSION = 1
+# Bills are monthly, so site reports carry the last year of them rather than the report's week
+BILLING_HISTORY = pd.DateOffset(years=1)
+
+
+def report_name(site, asset_id, registry):
+    name = f'{site} overview' if asset_id is None else registry.name_of(asset_id)
+    return os.path.join(quote(site, safe=' '), quote(name, safe=' '))
+
+
+def _within(frame, column, start, end):
+    return frame[(frame[column] >= start) & (frame[column] <= end)].reset_index(drop=True)
+
+
+def datasets(site, asset_id, start, end):
+    # The frames the dashboard's views load for a site overview or an asset, over [start, end]
+    cover = rollups.coverage(asset_id=asset_id, site=site if asset_id is None else None)
+    resolution = rollups.choose_resolution(start, end, cover=cover)
+    if resolution != 'raw':
+        energy = rollups.load_energy_rollup(resolution, asset_id=asset_id, site=site if asset_id is None else None,
+                                            start=start, end=end)
+    elif asset_id is not None:
+        energy = data_access.load_energy_usage(asset_id, start=start, end=end)
+    else:
+        energy = data_access.load_site_energy_usage(site, start=start, end=end)
+
+    if asset_id is not None:
+        frames = {
+            'energy': energy,
+            'batches': _within(data_access.load_batches(asset_id), 'start_time', start, end),
+            'efficiency': _within(efficiency.load_batch_efficiency(asset_id=asset_id), 'start_time', start, end),
+            'alerts': data_access.load_alerts(asset_id, start, end),
+        }
+    else:
+        frames = {
+            'energy': energy,
+            'batches': _within(data_access.load_site_batches(site), 'start_time', start, end),
+            'efficiency': _within(efficiency.load_batch_efficiency(site=site), 'start_time', start, end),
+            'alerts': data_access.load_site_alerts(site, start, end),
+            'billing': billing.load_bills([site], end - BILLING_HISTORY, end),
+        }
+    frames['efficiency_by_product'] = efficiency.by_product(frames['efficiency'])
+    return frames, resolution
+
+
+def frames_hash(frames, *extra):
+    digest = hashlib.sha256(repr((REPORT_VERSION, render_cache.DRAWING_VERSION, *extra)).encode())
+    for name, frame in frames.items():
+        digest.update(render_cache.data_hash(frame, name).encode())
+    return digest.hexdigest()
+
+
+def _title_page(title, start, end, resolution, frames):
+    plt, _ = figures.plotting()
+    fig = plt.figure(figsize=(12, 8))
+    lines = [f'{start:%Y-%m-%d %H:%M} – {end:%Y-%m-%d %H:%M}',
+             f'Energy at {resolution} resolution' if resolution != 'raw' else 'Energy readings at full resolution',
+             '', *(f'{name}: {len(frame):,} rows' for name, frame in frames.items())]
+    fig.text(0.08, 0.85, title, fontsize=22, weight='bold')
+    fig.text(0.08, 0.78, '\n'.join(lines), fontsize=12, va='top')
+    return fig
+
+
+def figures_for(title, asset_id, frames, start, end, resolution):
+    # The views' figures in page order; datasets with no rows get no page
+    yield _title_page(title, start, end, resolution, frames)
+    if not frames['energy'].empty:
+        yield figures.draw_energy(frames['energy'], series='asset_name' if asset_id is None else None)
+    if not frames['batches'].empty:
+        draw = figures.draw_asset_volume if asset_id is not None else figures.draw_overview_volume
+        yield draw(frames['batches'])
+    if not frames['alerts'].empty:
+        yield figures.draw_alerts(frames['alerts'])
+    if not frames.get('billing', pd.DataFrame()).empty:
+        yield figures.draw_utility_summary(frames['billing'])
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+    try:
+        with open(staging, 'wb') as out:
+            out.write(data)
+        os.replace(staging, path)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+
+
+def write_pdf(path, pages):
+    from matplotlib.backends.backend_pdf import PdfPages
+    plt, _ = figures.plotting()
+
+    buffer = io.BytesIO()
+    with PdfPages(buffer) as pdf:
+        for fig in pages:
+            pdf.savefig(fig)
+            plt.close(fig)
+    _write_atomic(path, buffer.getvalue())
+
+
+def write_csv_bundle(path, frames):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for name, frame in frames.items():
+            bundle.writestr(f'{name}.csv', data_access.exported(frame).to_csv(index=False))
+    _write_atomic(path, buffer.getvalue())
+
+
+def build(out_dir, name, site, asset_id, title, start, end, formats, previous_hash):
+    # Runs in a pool process: loads the report's frames, and renders them unless they hash as last time.
+    # Returns (name, hash, built)
+    frames, resolution = datasets(site, asset_id, start, end)
+    digest = frames_hash(frames, title, start, end, sorted(formats))
+    paths = {fmt: os.path.join(out_dir, f"{name}.{'zip' if fmt == 'csv' else fmt}") for fmt in formats}
+    if digest == previous_hash and all(os.path.exists(path) for path in paths.values()):
+        return name, digest, False
+
+    if 'pdf' in paths:
+        write_pdf(paths['pdf'], figures_for(title, asset_id, frames, start, end, resolution))
+    if 'csv' in paths:
+        write_csv_bundle(paths['csv'], frames)
+    return name, digest, True
+
+
+def _init_worker(db_path):
+    # Each pool process draws off-screen, and reads the database the parent was pointed at
+    import matplotlib
+    matplotlib.use('Agg')
+    data_access.DB_PATH = db_path
+
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_manifest(out_dir, manifest):
+    _write_atomic(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+
+def run(out_dir, days=DEFAULT_DAYS, end=None, sites=None, assets=True, formats=FORMATS, workers=None, force=False):
+    # Every site's report and, with assets, every asset's, rendered in parallel. matplotlib draws one figure at a
+    # time per process, so the pool is of processes. A report that fails is logged and the rest still built.
+    # Returns {'built': [...], 'skipped': [...], 'failed': [...]}
+    for db_path in data_access.databases():
+        migrations.migrate(db_path)
+    # Bring the derived tables up to date once here rather than in every report
+    data_access.fan_out(rollups.refresh)
+    data_access.fan_out(alert_engine.evaluate)
+    data_access.fan_out(efficiency.refresh)
+
+    registry = asset_registry.load_registry()
+    sites = list(registry.sites) if sites is None else sites
+    jobs = []
+    for site in sites:
+        if end is None:
+            latest = data_access.energy_time_bounds(site=site)[1]
+            if latest is None:
+                continue
+            site_end = latest
+        else:
+            site_end = pd.Timestamp(end)
+        start = site_end - pd.Timedelta(days=days)
+        for asset_id in [None, *(registry.site_assets(site) if assets else [])]:
+            title = f'{site} overview' if asset_id is None else f'{site}: {registry.name_of(asset_id)}'
+            jobs.append((report_name(site, asset_id, registry), site, asset_id, title, start, site_end))
+
+    manifest = {} if force else read_manifest(out_dir)
+    results = {'built': [], 'skipped': [], 'failed': []}
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(data_access.DB_PATH,)) as pool:
+            futures = {pool.submit(build, out_dir, name, site, asset_id, title, start, site_end, formats,
+                                   manifest.get(name)): name
+                       for name, site, asset_id, title, start, site_end in jobs}
+            for future in as_completed(futures):
+                try:
+                    name, digest, built = future.result()
+                except Exception as error:
+                    # A failed report keeps its previous manifest entry, so it is retried next run
+                    results['failed'].append(futures[future])
+                    print(f'failed: {futures[future]}: {type(error).__name__}: {error}', file=sys.stderr, flush=True)
+                    continue
+                manifest[name] = digest
+                results['built' if built else 'skipped'].append(name)
+                print(f"{'built' if built else 'unchanged'}: {name}", flush=True)
+    finally:
+        # Even an interrupted run records the reports it finished
+        write_manifest(out_dir, manifest)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build PDF and CSV reports of every site and asset in parallel.')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--out', default='reports', help='directory for the reports and their manifest')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='days each report covers (default: 7)')
+    parser.add_argument('--end', help="report period end (default: each site's newest reading)")
+    parser.add_argument('--sites', nargs='+', help='only these sites (default: every site)')
+    parser.add_argument('--no-assets', action='store_true', help='site overviews only')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument('--workers', type=int, help='render processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='rebuild reports whose data has not changed')
+    args = parser.parse_args()
+
+    data_access.DB_PATH = args.db
+
+    started = time.perf_counter()
+    results = run(args.out, args.days, args.end, args.sites, not args.no_assets, args.formats, args.workers,
+                  args.force)
+    print(f"Built {len(results['built'])} reports, {len(results['skipped'])} unchanged, {len(results['failed'])} "
+          f"failed, in {args.out} in {time.perf_counter() - started:.1f}s")
+    if results['failed']:
+        sys.exit(1)
@@ -0,0 +1,279 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+
+import pandas as pd
+
+import alert_engine
+import archive
+import archiver
+import data_access
+import efficiency
+import migrations
+import rollups
+
+
+# How long each table keeps its rows, measured back from the newest reading; None keeps them forever.
+# Raw readings and alerts leave SQLite by way of the Parquet archive (archiver.ARCHIVED_TABLES): whole months
+# past their cutoff are archived rather than deleted, so their history stays readable and only max_age ever
+# drops it. Rollup rows are deleted outright; each level outlives the finer one, and rollups.coverage picks the
+# finest level still holding a range
+POLICIES = {
+    'energy_usage': pd.Timedelta(days=30),
+    'energy_rollup_hourly': pd.Timedelta(days=365),
+    'energy_rollup_daily': pd.Timedelta(days=5 * 365),
+    'energy_rollup_monthly': None,
+    'alerts': pd.Timedelta(days=2 * 365),
+}
+# Column each table ages by; each table has an (asset_id, column) index to delete along
+TIME_COLUMNS = {'energy_usage': 'timestamp', 'alerts': 'timestamp', **{
+    f'energy_rollup_{level}': 'bucket_start' for level in rollups.LEVELS}}
+
+# Rows deleted per write transaction, and the pause after each so ingest and the refresh jobs get the lock
+BATCH_ROWS = 5000
+BATCH_PAUSE_SECONDS = 0.05
+
+
+def newest_reading(conn, db_path):
+    # Per-asset MAX subqueries are single seeks on the (asset_id, timestamp) index; the archive only counts
+    # once every reading has been archived
+    latest, = conn.execute(
+        'SELECT MAX((SELECT MAX(timestamp) FROM energy_usage e WHERE e.asset_id = a.asset_id)) FROM assets a'
+    ).fetchone()
+    if latest is None:
+        latest = archive.time_bounds(archive.archive_dir(db_path), 'energy_usage')[1]
+    return pd.Timestamp(latest) if latest is not None else None
+
+
+def cutoffs(conn, as_of, policies=POLICIES, max_age=None):
+    # Per table, the time before which rows go. max_age caps every table, those kept forever included
+    result = {}
+    for table, keep in policies.items():
+        horizons = [as_of - age for age in (keep, max_age) if age is not None]
+        if horizons:
+            result[table] = max(horizons)
+
+    if 'energy_usage' in result:
+        # Batches still waiting for attribution need their readings, and the one held into them
+        pending, = conn.execute('SELECT MIN(b.start_time) FROM batch_energy e '
+                                'JOIN batches b ON b.batch_id = e.batch_id WHERE e.complete = 0').fetchone()
+        if pending is not None:
+            result['energy_usage'] = min(result['energy_usage'], pd.Timestamp(pending) - rollups.MAX_INTEGRATION_GAP)
+    return result
+
+
+def _folded_ids(conn):
+    # Raw readings the rollups and the alert engine have both consumed
+    return min(data_access.get_watermark(conn, rollups.STATE_NAME),
+               data_access.get_watermark(conn, alert_engine.ENERGY_STATE))
+
+
+def _delete_sql(table, column, folded):
+    sql = f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE asset_id = ? AND {column} < ?'
+    if folded:
+        sql += f' AND {archive.id_column(table)} <= ?'
+    return sql + ' LIMIT ?)'
+
+
+def _reclaim(conn):
+    # Hands the pages a batch freed back to the file system. Only with auto_vacuum = INCREMENTAL; otherwise they
+    # stay on the free list for new rows to reuse. executescript steps the pragma to the end; execute() would
+    # stop after the first page
+    conn.executescript('PRAGMA incremental_vacuum')
+
+
+def expire(conn, table, cutoff, batch_rows=BATCH_ROWS, pause=BATCH_PAUSE_SECONDS):
+    # Deletes a table's rows older than cutoff, one asset and at most batch_rows rows per transaction, so the
+    # write lock is never held for long; returns (rows deleted, batches)
+    column = TIME_COLUMNS[table]
+    folded = table == 'energy_usage'
+    sql = _delete_sql(table, column, folded)
+    deleted = batches = 0
+    for asset_id, in conn.execute('SELECT asset_id FROM assets ORDER BY asset_id').fetchall():
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                params = [asset_id, cutoff.strftime(data_access.TIMESTAMP_FORMAT)]
+                if folded:
+                    params.append(_folded_ids(conn))
+                count = conn.execute(sql, (*params, batch_rows)).rowcount
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            _reclaim(conn)
+            deleted += count
+            batches += 1
+            if count < batch_rows:
+                break
+            time.sleep(pause)
+    return deleted, batches
+
+
+def _count_expired(conn, table, cutoff):
+    column = TIME_COLUMNS[table]
+    sql = f'SELECT COUNT(*) FROM {table} WHERE asset_id = ? AND {column} < ?'
+    params = [cutoff.strftime(data_access.TIMESTAMP_FORMAT)]
+    if table == 'energy_usage':
+        sql += f' AND {archive.id_column(table)} <= ?'
+        params.append(_folded_ids(conn))
+    return sum(conn.execute(sql, (asset_id, *params)).fetchone()[0]
+               for asset_id, in conn.execute('SELECT asset_id FROM assets').fetchall())
+
+
+def expire_archive(root, table, cutoff):
+    # Archived months wholly before cutoff are dropped with their partition; returns (partitions, bytes)
+    dropped = freed = 0
+    table_dir = os.path.join(root, table)
+    if not os.path.isdir(table_dir):
+        return dropped, freed
+    for site_dir in os.scandir(table_dir):
+        if not site_dir.is_dir() or not site_dir.name.startswith('site='):
+            continue
+        for month_dir in os.scandir(site_dir.path):
+            if not month_dir.name.startswith('month='):
+                continue
+            month_end = pd.Period(month_dir.name[len('month='):], 'M').end_time.floor('s')
+            if month_end < cutoff:
+                freed += sum(entry.stat().st_size for entry in os.scandir(month_dir.path) if entry.is_file())
+                shutil.rmtree(month_dir.path)
+                dropped += 1
+    if dropped:
+        archive.mark_updated(root, table)
+    return dropped, freed
+
+
+def file_bytes(db_path):
+    return sum(os.path.getsize(path) for path in (db_path, f'{db_path}-wal') if os.path.exists(path))
+
+
+def enable_incremental_vacuum(db_path):
+    # auto_vacuum only changes with a full VACUUM, which rewrites the file under an exclusive lock, so this is a
+    # one-off step for a maintenance window rather than part of every pass
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+def apply(db_path=None, policies=POLICIES, max_age=None, as_of=None, dry_run=False,
+          batch_rows=BATCH_ROWS, pause=BATCH_PAUSE_SECONDS):
+    # One retention pass over a database and its archive; returns what it removed and the space it got back
+    db_path = db_path or data_access.DB_PATH
+    started = time.perf_counter()
+    migrations.migrate(db_path)
+    if not dry_run:
+        # Fold every reading in first, so nothing is deleted before the rollups, alerts and batches have seen it
+        rollups.refresh(db_path)
+        alert_engine.evaluate(db_path)
+        efficiency.refresh(db_path)
+
+    size_before = file_bytes(db_path)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        as_of = pd.Timestamp(as_of) if as_of is not None else newest_reading(conn, db_path)
+        report = {'db': os.path.abspath(db_path), 'as_of': str(as_of), 'tables': {}, 'archive': {}}
+        if as_of is None:
+            return report
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+
+        for table, cutoff in cutoffs(conn, as_of, policies, max_age).items():
+            table_started = time.perf_counter()
+            archived = 0
+            if table in archiver.ARCHIVED_TABLES:
+                # Archived a whole month at a time: the cutoff's own month stays until it is past entirely
+                cutoff = cutoff.to_period('M').to_timestamp()
+                if not dry_run:
+                    archived = archiver.archive_history(db_path, before=cutoff, tables=[table])[table]
+            if dry_run:
+                deleted, batches = _count_expired(conn, table, cutoff), 0
+            else:
+                deleted, batches = expire(conn, table, cutoff, batch_rows, pause)
+            report['tables'][table] = {'cutoff': str(cutoff), 'rows': deleted, 'archived': archived,
+                                       'batches': batches, 'seconds': round(time.perf_counter() - table_started, 2)}
+
+        # The archive is where expired raw history is kept, so only max_age reaches into it
+        if max_age is not None and not dry_run:
+            root = archive.archive_dir(db_path)
+            for table in ['energy_usage', 'alerts']:
+                partitions, freed = expire_archive(root, table, as_of - max_age)
+                report['archive'][table] = {'partitions': partitions, 'bytes': freed}
+
+        if not dry_run:
+            # Moves the freed pages out of the WAL into the file, which incremental_vacuum has already shrunk
+            _reclaim(conn)
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        conn.close()
+
+    size_after = file_bytes(db_path)
+    report.update(
+        incremental_vacuum=auto_vacuum == 2,
+        bytes_before=size_before,
+        bytes_after=size_after,
+        reclaimed_bytes=size_before - size_after + sum(stats['bytes'] for stats in report['archive'].values()),
+        reusable_bytes=free_pages * page_size,
+        seconds=round(time.perf_counter() - started, 2),
+    )
+    return report
+
+
+def _print_report(report):
+    print(f"{report['db']} (as of {report['as_of']}):")
+    for table, stats in report['tables'].items():
+        print(f"  {table:<24}{stats['rows']:>12,} rows before {stats['cutoff']}"
+              + (f" in {stats['batches']} batches, {stats['seconds']:.1f}s" if stats['batches'] else '')
+              + (f", {stats['archived']:,} archived first" if stats['archived'] else ''))
+    for table, stats in report['archive'].items():
+        print(f"  {table + ' archive':<24}{stats['partitions']:>12,} partitions, {stats['bytes'] / 1e6:.1f} MB")
+    if 'seconds' not in report:
+        return
+    print(f"  reclaimed {report['reclaimed_bytes'] / 1e6:.1f} MB "
+          f"({report['bytes_before'] / 1e6:.1f} MB -> {report['bytes_after'] / 1e6:.1f} MB on disk) "
+          f"in {report['seconds']:.1f}s")
+    if not report['incremental_vacuum'] and report['reusable_bytes']:
+        print(f"  {report['reusable_bytes'] / 1e6:.1f} MB freed inside the file for new rows to reuse; run once "
+              f"with --enable-incremental-vacuum to let retention shrink the file")
+
+
+def _policy(value):
+    table, _, days = value.partition('=')
+    if table not in POLICIES or not days:
+        raise argparse.ArgumentTypeError(f"expected TABLE=DAYS with TABLE one of {', '.join(POLICIES)}")
+    if days == 'forever':
+        return table, None
+    return table, pd.Timedelta(days=int(days))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Expire old telemetry by per-table retention policies and give the '
+                                                 'space back, in small batches safe to run next to the dashboard.')
+    parser.add_argument('--db', help='database to clean (default: every database the dashboard reads)')
+    parser.add_argument('--keep', type=_policy, action='append', default=[], metavar='TABLE=DAYS',
+                        help='days of rows a table keeps, or "forever"; repeatable. Defaults: ' + ', '.join(
+                            f"{table}={keep.days if keep is not None else 'forever'}"
+                            for table, keep in POLICIES.items()))
+    parser.add_argument('--max-age-years', type=float,
+                        help='also delete anything older than this everywhere, the Parquet archive included')
+    parser.add_argument('--as-of', help='measure ages from this date instead of the newest reading')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--dry-run', action='store_true', help='count what would be deleted or archived without touching it')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='first switch the database to auto_vacuum=INCREMENTAL with one full VACUUM')
+    args = parser.parse_args()
+
+    policies = {**POLICIES, **dict(args.keep)}
+    max_age = pd.Timedelta(days=args.max_age_years * 365) if args.max_age_years else None
+    for db_path in [args.db] if args.db else data_access.databases():
+        if args.enable_incremental_vacuum and not args.dry_run:
+            started = time.perf_counter()
+            enable_incremental_vacuum(db_path)
+            print(f'{db_path}: auto_vacuum=INCREMENTAL in {time.perf_counter() - started:.1f}s')
+        _print_report(apply(db_path, policies, max_age, args.as_of, args.dry_run, args.batch_rows))
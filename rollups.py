@@ -0,0 +1,247 @@
+import argparse
+import sqlite3
+
+import pandas as pd
+
+import data_access
+
+
+LEVELS = {
+    'hourly': pd.Timedelta(hours=1),
+    'daily': pd.Timedelta(days=1),
+    'monthly': pd.Timedelta(days=30),
+}
+METRICS = ['power_kw', 'voltage', 'amperage']
+STATS = ['count', 'sum', 'min', 'max']
+
+# A reading's power is assumed to hold until the next reading, but never for longer than this
+MAX_INTEGRATION_GAP = pd.Timedelta(hours=1)
+
+# Use a rollup only when it still gives at least this many points across the requested range
+ROLLUP_MIN_POINTS = 200
+# Finest first
+RESOLUTIONS = ['raw', *LEVELS]
+
+REFRESH_CHUNK_ROWS = 200_000
+STATE_NAME = 'rollups.energy_usage'
+
+
+def bucket_starts(timestamps, level):
+    if level == 'monthly':
+        return timestamps.dt.to_period('M').dt.start_time
+    return timestamps.dt.floor('h' if level == 'hourly' else 'D')
+
+
+def _upsert_sql(level):
+    metric_updates = []
+    for metric in METRICS:
+        metric_updates += [
+            f'{metric}_count = {metric}_count + excluded.{metric}_count',
+            f'{metric}_sum = COALESCE({metric}_sum, 0) + COALESCE(excluded.{metric}_sum, 0)',
+            f'{metric}_min = MIN(COALESCE({metric}_min, excluded.{metric}_min), COALESCE(excluded.{metric}_min, {metric}_min))',
+            f'{metric}_max = MAX(COALESCE({metric}_max, excluded.{metric}_max), COALESCE(excluded.{metric}_max, {metric}_max))',
+        ]
+    columns = ['asset_id', 'bucket_start', 'readings'] + [
+        f'{metric}_{stat}' for metric in METRICS for stat in STATS] + ['energy_kwh']
+    return (f"INSERT INTO energy_rollup_{level} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT (asset_id, bucket_start) DO UPDATE SET readings = readings + excluded.readings, "
+            f"{', '.join(metric_updates)}, energy_kwh = energy_kwh + excluded.energy_kwh")
+
+
+def _aggregate(readings, level):
+    readings = readings.assign(bucket_start=bucket_starts(readings['timestamp'], level))
+    grouped = readings.groupby(['asset_id', 'bucket_start'], sort=False)
+    frame = grouped.agg(readings=('usage_id', 'size'), **{
+        f'{metric}_{stat}': (metric, stat) for metric in METRICS for stat in STATS
+    }, energy_kwh=('energy_kwh', 'sum')).reset_index()
+    frame['bucket_start'] = frame['bucket_start'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def _previous_readings(conn, asset_ids, high_water_mark):
+    # The last already-rolled reading of each asset only learns its duration once the next reading arrives
+    rows = []
+    for asset_id in asset_ids:
+        row = conn.execute(
+            'SELECT usage_id, asset_id, timestamp, power_kw FROM energy_usage '
+            'WHERE asset_id = ? AND usage_id <= ? ORDER BY timestamp DESC LIMIT 1',
+            (int(asset_id), high_water_mark)).fetchone()
+        if row is not None:
+            rows.append(row)
+    return pd.DataFrame(rows, columns=['usage_id', 'asset_id', 'timestamp', 'power_kw'])
+
+
+def _refresh_chunk(conn, high_water_mark):
+    new = pd.read_sql_query(
+        'SELECT usage_id, asset_id, timestamp, power_kw, voltage, amperage FROM energy_usage '
+        'WHERE usage_id > ? ORDER BY usage_id LIMIT ?',
+        conn, params=(high_water_mark, REFRESH_CHUNK_ROWS))
+    if new.empty:
+        return 0, high_water_mark
+
+    previous = _previous_readings(conn, new['asset_id'].unique(), high_water_mark)
+    previous['carried'] = True
+    new['carried'] = False
+
+    # kWh = power held until the next reading of the same asset (readings are assumed to arrive in time order)
+    readings = pd.concat([previous, new], ignore_index=True)
+    readings['timestamp'] = pd.to_datetime(readings['timestamp'])
+    readings = readings.sort_values(['asset_id', 'timestamp'], kind='stable')
+    held = readings.groupby('asset_id')['timestamp'].shift(-1) - readings['timestamp']
+    hours = held.clip(upper=MAX_INTEGRATION_GAP).dt.total_seconds().fillna(0) / 3600
+    readings['energy_kwh'] = readings['power_kw'].fillna(0) * hours
+
+    carried = readings[readings['carried']]
+    fresh = readings[~readings['carried']]
+    for level in LEVELS:
+        conn.executemany(_upsert_sql(level), _aggregate(fresh, level).itertuples(index=False, name=None))
+
+        carried_kwh = carried.assign(bucket_start=bucket_starts(carried['timestamp'], level))
+        conn.executemany(
+            f'UPDATE energy_rollup_{level} SET energy_kwh = energy_kwh + ? WHERE asset_id = ? AND bucket_start = ?',
+            [(float(row.energy_kwh), int(row.asset_id), row.bucket_start.strftime('%Y-%m-%d %H:%M:%S'))
+             for row in carried_kwh.itertuples() if row.energy_kwh])
+
+    high_water_mark = int(new['usage_id'].max())
+    data_access.set_watermark(conn, STATE_NAME, high_water_mark)
+    return len(new), high_water_mark
+
+
+def refresh(db_path=None):
+    # Folds every energy_usage row above the stored high-water mark into all rollup levels
+    db_path = db_path or data_access.DB_PATH
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        total = 0
+        while True:
+            # IMMEDIATE takes the write lock up front, so concurrent refreshers never double count
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rolled, _ = _refresh_chunk(conn, data_access.get_watermark(conn, STATE_NAME))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            total += rolled
+            if rolled < REFRESH_CHUNK_ROWS:
+                return total
+    finally:
+        conn.close()
+
+
+def _bucket_start(timestamp, level):
+    return bucket_starts(pd.Series([timestamp]), level).iloc[0]
+
+
+def coverage(asset_id=None, site=None):
+    # Where each resolution's data begins for an asset or a site: 'raw' (hot rows and the archive) and every rollup
+    # level, plus 'first' and 'latest', the bounds of everything the dashboard can show. Retention deletes raw
+    # readings while their hourly buckets stay, so an old range may only be left in a rollup
+    first, latest = data_access.energy_time_bounds(asset_id=asset_id, site=site)
+    # Per-asset MIN/MAX subqueries are single seeks on each rollup's (asset_id, bucket_start) key
+    columns = ', '.join(f'{agg}((SELECT {agg}(bucket_start) FROM energy_rollup_{level} r '
+                        f'WHERE r.asset_id = a.asset_id)) AS {level}_{agg}'
+                        for level in LEVELS for agg in ['MIN', 'MAX'])
+    if asset_id is not None:
+        frame = data_access.read_sql(f'SELECT {columns} FROM assets a WHERE a.asset_id = ?', (int(asset_id),),
+                                     data_access.asset_db(asset_id))
+    else:
+        frame = data_access.read_sql(f'SELECT {columns} FROM assets a WHERE a.site = ?', (site,),
+                                     data_access.site_db(site))
+    bounds = {column: pd.Timestamp(value) if value is not None else None for column, value in frame.iloc[0].items()}
+    result = {'raw': first, 'first': first, 'latest': latest}
+    for level in LEVELS:
+        result[level] = bounds[f'{level}_MIN']
+        # A level only reaches further back when it begins a whole bucket before what the finer ones hold
+        if result[level] is not None and (result['first'] is None
+                                          or result[level] < _bucket_start(result['first'], level)):
+            result['first'] = result[level]
+        # Once every reading of the assets has expired, the newest bucket is the newest data
+        if result['latest'] is None:
+            result['latest'] = bounds[f'{level}_MAX']
+    return result
+
+
+def merge_coverage(coverages):
+    # One coverage over several assets: each resolution begins with the earliest of theirs
+    result = {}
+    for key in ['raw', 'first', *LEVELS, 'latest']:
+        values = [cover[key] for cover in coverages if cover[key] is not None]
+        result[key] = (max(values) if key == 'latest' else min(values)) if values else None
+    return result
+
+
+def _holds_expired(cover, level):
+    # Whether a level has buckets from before the raw readings begin; a level rolled up from readings still
+    # kept starts in the same bucket as they do
+    if cover[level] is None:
+        return False
+    return cover['raw'] is None or cover[level] < _bucket_start(cover['raw'], level)
+
+
+def choose_resolution(start, end, min_points=ROLLUP_MIN_POINTS, cover=None):
+    # Coarsest rollup that still spreads at least min_points buckets across the range. With a coverage, a range
+    # reaching back before the raw readings is served at least as coarse as the finest level still holding it
+    if start is None or end is None:
+        return 'raw'
+    span = end - start
+    resolution = next((level for level in ('monthly', 'daily', 'hourly') if span / LEVELS[level] >= min_points),
+                      'raw')
+    if cover is not None and (cover['raw'] is None or start < cover['raw']):
+        kept = next((level for level in LEVELS if _holds_expired(cover, level) and cover[level] <= end), None)
+        if kept is not None and RESOLUTIONS.index(kept) > RESOLUTIONS.index(resolution):
+            resolution = kept
+    return resolution
+
+
+def load_energy_rollup(level, asset_id=None, site=None, start=None, end=None):
+    # Same columns as the raw energy_usage frames (means per bucket), plus the min/max envelope and kWh
+    means = ', '.join(f'r.{m}_sum / NULLIF(r.{m}_count, 0) AS {m}, r.{m}_min, r.{m}_max' for m in METRICS)
+    clause, params = data_access.time_range_clause('r.bucket_start', start, end)
+    sql = (f'SELECT r.asset_id, r.bucket_start AS timestamp, r.readings, {means}, r.energy_kwh, a.name AS asset_name '
+           f'FROM energy_rollup_{level} r JOIN assets a ON a.asset_id = r.asset_id ')
+    if asset_id is not None:
+        sql += f'WHERE r.asset_id = ?{clause} ORDER BY r.bucket_start'
+        return data_access.read_sql(sql, [int(asset_id), *params], data_access.asset_db(asset_id))
+    sql += f'WHERE a.site = ?{clause} ORDER BY r.asset_id, r.bucket_start'
+    return data_access.read_sql(sql, [site, *params], data_access.site_db(site))
+
+
+def utility_cross_check(db_path=None, sites=None, start=None, end=None):
+    # Billed total_kwh per site and month next to the metered kWh integrated into the monthly rollup,
+    # optionally for some sites and billing periods starting in [start, end]
+    db_path = db_path or data_access.DB_PATH
+    clause, params = '', []
+    if sites is not None:
+        sites = list(sites)
+        clause += f" AND u.site IN ({', '.join('?' for _ in sites)})"
+        params += sites
+    if start is not None:
+        clause += ' AND u.billing_period_start >= ?'
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        clause += ' AND u.billing_period_start <= ?'
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    return data_access.read_sql(
+        'SELECT u.site, u.billing_period_start, u.total_kwh AS billed_kwh, '
+        'COALESCE(SUM(r.energy_kwh), 0) AS metered_kwh, '
+        'u.total_kwh - COALESCE(SUM(r.energy_kwh), 0) AS difference_kwh '
+        'FROM utility_summary u '
+        'LEFT JOIN assets a ON a.site = u.site '
+        "LEFT JOIN energy_rollup_monthly r ON r.asset_id = a.asset_id "
+        "AND r.bucket_start = strftime('%Y-%m-01 00:00:00', u.billing_period_start) "
+        f'WHERE 1 = 1{clause} '
+        'GROUP BY u.summary_id ORDER BY u.site, u.billing_period_start',
+        params, db_path=db_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incrementally refresh the energy_usage rollup tables.')
+    parser.add_argument('--db', default=data_access.DB_PATH)
+    parser.add_argument('--cross-check', action='store_true', help='also print billed vs metered kWh per site and month')
+    args = parser.parse_args()
+
+    print(f'Rolled up {refresh(args.db)} new energy_usage rows')
+    if args.cross_check:
+        print(utility_cross_check(args.db).to_string(index=False))
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+from urllib.parse import quote
+
+
+# Sites can each live in their own database file. SUSTAINABILITY_SHARDS names a JSON file mapping every site to
+# its database, relative paths being taken from the file's directory:
+#   {"Houston": "houston.db", "Orlando": "orlando.db", "Chicago": "chicago.db"}
+# Adding a site is one more entry there. Left unset, every site lives in the one SUSTAINABILITY_DB database.
+# Asset ids must be unique across the shards: the dashboard and API address assets by id alone
+CONFIG_PATH = os.environ.get('SUSTAINABILITY_SHARDS', '')
+
+
+def load_config(path):
+    with open(path) as config:
+        sites = json.load(config)
+    root = os.path.dirname(os.path.abspath(path))
+    return {site: os.path.join(root, db_path) for site, db_path in sites.items()}
+
+
+# site -> database file; empty when the sites share one database
+SITE_DBS = load_config(CONFIG_PATH) if CONFIG_PATH else {}
+
+
+def shard_name(site):
+    return f"{quote(site.lower(), safe='')}.db"
+
+
+def _site_tables(conn):
+    # Tables whose rows belong to one site, and the column that says which
+    tables = {}
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if 'site' in columns:
+            tables[table] = 'site'
+        elif 'asset_id' in columns:
+            tables[table] = 'asset_id'
+    return tables
+
+
+def split(db_path, out_dir):
+    # One database per site holding only that site's rows, under the same ids, its archive partitions
+    # alongside, and a config naming them all. The source database is left as it is
+    import archive
+    import migrations
+
+    migrations.migrate(db_path)
+    os.makedirs(out_dir, exist_ok=True)
+    # Sites of every table keyed by site, so one that is only billed so far gets a shard too
+    source = sqlite3.connect(db_path)
+    try:
+        sites = sorted({site for table, column in _site_tables(source).items() if column == 'site'
+                        for (site,) in source.execute(f'SELECT DISTINCT site FROM {table}')})
+    finally:
+        source.close()
+
+    config = {}
+    for site in sites:
+        started = time.perf_counter()
+        shard = os.path.join(out_dir, shard_name(site))
+        if os.path.exists(shard):
+            raise FileExistsError(f'{shard} already exists')
+
+        source = sqlite3.connect(db_path)
+        try:
+            source.execute('VACUUM INTO ?', (shard,))
+        finally:
+            source.close()
+
+        conn = sqlite3.connect(shard, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for table, column in _site_tables(conn).items():
+                if column == 'site':
+                    conn.execute(f'DELETE FROM {table} WHERE site != ?', (site,))
+                else:
+                    conn.execute(f'DELETE FROM {table} WHERE asset_id NOT IN '
+                                 '(SELECT asset_id FROM assets WHERE site = ?)', (site,))
+            conn.execute('COMMIT')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+        migrations.migrate(shard)
+
+        # Archived history is partitioned by site already, so the site's partitions move over as they are
+        source_root, shard_root = archive.archive_dir(db_path), archive.archive_dir(shard)
+        for table in archive.TABLE_SCHEMAS:
+            partitions = os.path.join(source_root, table, f"site={quote(site, safe='')}")
+            if os.path.isdir(partitions):
+                shutil.copytree(partitions, os.path.join(shard_root, table, os.path.basename(partitions)))
+                archive.mark_updated(shard_root, table)
+
+        config[site] = os.path.basename(shard)
+        print(f'{site}: {shard} ({os.path.getsize(shard) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s')
+
+    config_path = os.path.join(out_dir, 'shards.json')
+    with open(config_path, 'w') as out:
+        json.dump(config, out, indent=2)
+    return config_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Split a database into one database per site.')
+    parser.add_argument('--db', default=os.environ.get('SUSTAINABILITY_DB', 'sustainability_data.db'))
+    parser.add_argument('--out', default='shards', help='directory for the site databases and their config')
+    args = parser.parse_args()
+
+    config_path = split(args.db, args.out)
+    print(f'Wrote {config_path}; set SUSTAINABILITY_SHARDS={config_path} to serve the sites from their shards')
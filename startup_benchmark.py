@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# Seconds a fresh interpreter may take to import main, and modules the login dialog and the Home page must not load
+IMPORT_BUDGET_SECONDS = 1.0
+PLOTTING_MODULES = ['altair', 'matplotlib', 'seaborn']
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_MAIN = '''
+import time
+started = time.perf_counter()
+import main
+print(time.perf_counter() - started)
+'''
+
+# One page rendered in a fresh interpreter the way a new server process renders its first session
+FIRST_PAGE = '''
+import json, sys, time
+import streamlit.logger
+from streamlit.testing.v1 import AppTest
+streamlit.logger.set_log_level('error')
+app = AppTest.from_file('main.py', default_timeout=60)
+if sys.argv[1] == 'home':
+    app.session_state.show_authenticate = False
+started = time.perf_counter()
+app.run()
+print(json.dumps({'seconds': time.perf_counter() - started, 'errors': [e.message for e in app.exception],
+                  'plotting': [m for m in %r if m in sys.modules]}))
+''' % PLOTTING_MODULES
+
+
+def _child(code, db_path, *args, importtime=False):
+    # Warm-up is off so only what the page itself imports is loaded
+    env = {**os.environ, 'SUSTAINABILITY_DB': db_path, 'SUSTAINABILITY_WARM_UP': '0', 'MPLBACKEND': 'Agg'}
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', code, *args]
+    done = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    return done.stdout.strip().splitlines()[-1], done.stderr
+
+
+def _slowest_imports(importtime, top):
+    # What importing main pulls in, from the `-X importtime` report: its direct imports and theirs, by
+    # cumulative time. The report lists each module after everything it imported, nested two spaces a level
+    modules = []
+    for line in importtime.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'main':
+                break
+            modules = []
+        elif depth <= 2:
+            modules.append((name.rstrip()[1:], int(cumulative) / 1000))
+    modules.sort(key=lambda module: module[1], reverse=True)
+    return [{'module': name, 'cumulative_ms': round(ms, 1)} for name, ms in modules[:top]]
+
+
+def run(db_path, repeats=5, budget=IMPORT_BUDGET_SECONDS, top=10):
+    imports, pages = [], {'login': [], 'home': []}
+    slowest = None
+    loaded = {page: set() for page in pages}
+    errors = []
+    for _ in range(repeats):
+        seconds, importtime = _child(IMPORT_MAIN, db_path, importtime=True)
+        imports.append(float(seconds))
+        slowest = slowest or _slowest_imports(importtime, top)
+        for page in pages:
+            result = json.loads(_child(FIRST_PAGE, db_path, page)[0])
+            pages[page].append(result['seconds'])
+            loaded[page].update(result['plotting'])
+            errors += result['errors']
+
+    import_p50 = float(np.percentile(imports, 50))
+    failures = [f'{page} page loaded {", ".join(sorted(modules))}' for page, modules in loaded.items() if modules]
+    failures += [f'page raised: {error}' for error in errors]
+    if import_p50 > budget:
+        failures.append(f'import main took {import_p50:.3f}s, over the {budget:.3f}s budget')
+    return {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'db': os.path.abspath(db_path),
+        'python': platform.python_version(),
+        'repeats': repeats,
+        'budget_s': budget,
+        'import_main_ms': {'p50': round(import_p50 * 1000, 1), 'max': round(max(imports) * 1000, 1)},
+        'first_page_ms': {page: {'p50': round(float(np.percentile(samples, 50)) * 1000, 1),
+                                 'max': round(max(samples) * 1000, 1)}
+                          for page, samples in pages.items()},
+        'slowest_imports': slowest,
+        'failures': failures,
+    }
+
+
+def _print_table(result, out):
+    print(f"import main: p50 {result['import_main_ms']['p50']:.0f} ms, max {result['import_main_ms']['max']:.0f} ms "
+          f"(budget {result['budget_s'] * 1000:.0f} ms, {result['repeats']} fresh interpreters)", file=out)
+    for page, summary in result['first_page_ms'].items():
+        print(f"first {page} render: p50 {summary['p50']:.0f} ms, max {summary['max']:.0f} ms", file=out)
+    print('slowest imports under main:', file=out)
+    for module in result['slowest_imports']:
+        print(f"  {module['module']:<40}{module['cumulative_ms']:>10.1f} ms", file=out)
+    for failure in result['failures']:
+        print(f'FAIL: {failure}', file=out)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile cold-start imports of the dashboard and fail when startup '
+                                                 'exceeds its budget or the first pages load the plotting stack.')
+    parser.add_argument('--db', default=os.environ.get('SUSTAINABILITY_DB', 'sustainability_data.db'))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_SECONDS,
+                        help='seconds `import main` may take (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--output', help='append the JSON result as one line to this file')
+    args = parser.parse_args()
+
+    result = run(os.path.abspath(args.db), args.repeats, args.budget, args.top)
+    _print_table(result, sys.stderr)
+    if args.output:
+        with open(args.output, 'a') as out:
+            out.write(json.dumps(result) + '\n')
+    else:
+        print(json.dumps(result, indent=2))
+    sys.exit(1 if result['failures'] else 0)
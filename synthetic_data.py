@@ -0,0 +1,156 @@
+import argparse
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import migrations
+import rollups
+
+
+BASE_TABLES = ['assets', 'energy_usage', 'batches', 'alerts', 'baseline_performance', 'utility_summary']
+SITE_NAMES = ['Houston', 'Orlando', 'Chicago', 'Cleveland']
+ASSET_TYPES = ['Pump', 'Compressor', 'Mixer']
+PRODUCTS = [f'Product_{i}' for i in range(1, 6)]
+ALERT_TYPES = ['High Power', 'Voltage Spike', 'Overrun']
+
+INSERT_CHUNK_ROWS = 500_000
+
+# The bundled database is the reference for the base schema, whatever SUSTAINABILITY_DB points at
+TEMPLATE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sustainability_data.db')
+
+
+def site_names(count):
+    return SITE_NAMES[:count] + [f'Site {i}' for i in range(len(SITE_NAMES) + 1, count + 1)]
+
+
+def _timestamps(values):
+    return np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ')
+
+
+def _insert(conn, table, frame):
+    columns = list(frame.columns)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    conn.executemany(sql, zip(*(frame[column].tolist() for column in columns)))
+
+
+def _create_schema(conn, template_db):
+    # Same base schema as the bundled database; migrations add indexes and derived tables afterwards
+    template = sqlite3.connect(Path(template_db).resolve().as_uri() + '?mode=ro', uri=True)
+    statements = dict(template.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall())
+    template.close()
+    for table in BASE_TABLES:
+        conn.execute(statements[table])
+
+
+def generate(db_path, sites=3, assets_per_site=10, days=30, interval_minutes=1,
+             start='2024-01-01', seed=0, template_db=TEMPLATE_DB):
+    if os.path.exists(db_path):
+        raise FileExistsError(f'{db_path} already exists')
+
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(db_path)
+    # Nothing to protect while building a throwaway file; indexes come last so inserts stay append-only
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    _create_schema(conn, template_db)
+
+    names = site_names(sites)
+    asset_count = sites * assets_per_site
+    assets = pd.DataFrame({
+        'asset_id': np.arange(1, asset_count + 1),
+        'site': np.repeat(names, assets_per_site),
+        'type': rng.choice(ASSET_TYPES, asset_count),
+    })
+    assets['name'] = assets['type'] + ' ' + (300 + assets['asset_id']).astype(str)
+    base_power = rng.uniform(20, 60, asset_count)
+    base_runtime = rng.uniform(45, 120, asset_count)
+    _insert(conn, 'assets', assets[['asset_id', 'name', 'site', 'type']])
+    _insert(conn, 'baseline_performance', pd.DataFrame({
+        'asset_id': assets['asset_id'],
+        'avg_power_kw': base_power.round(2),
+        'avg_runtime_min': base_runtime.round(2),
+        'last_updated': start + ' 00:00:00',
+    }))
+
+    # Per-asset meter readings with a daily load cycle plus noise, generated in bounded chunks
+    times = np.arange(np.datetime64(start), np.datetime64(start) + np.timedelta64(days, 'D'),
+                      np.timedelta64(interval_minutes, 'm'))
+    day_phase = np.sin(2 * np.pi * (times - times.astype('datetime64[D]')).astype(np.int64) / (24 * 60 * 60 * 1e6))
+    stamps = _timestamps(times)
+    assets_per_chunk = max(1, INSERT_CHUNK_ROWS // len(times))
+    for first in range(0, asset_count, assets_per_chunk):
+        ids = np.arange(first, min(first + assets_per_chunk, asset_count))
+        power = base_power[ids, None] * (1 + 0.2 * day_phase) + rng.normal(0, 1.5, (len(ids), len(times)))
+        voltage = rng.normal(220, 4, power.shape)
+        _insert(conn, 'energy_usage', pd.DataFrame({
+            'asset_id': np.repeat(ids + 1, len(times)),
+            'timestamp': np.tile(stamps, len(ids)),
+            'power_kw': power.ravel().round(2),
+            'voltage': voltage.ravel().round(2),
+            'amperage': (power * 1000 / voltage / 10).ravel().round(2),
+        }))
+        conn.commit()
+
+    # Roughly four batches per asset per day
+    batch_count = asset_count * days * 4
+    batch_assets = rng.integers(1, asset_count + 1, batch_count)
+    batch_start = np.datetime64(start) + rng.integers(0, days * 24 * 60, batch_count).astype('timedelta64[m]')
+    runtime = rng.normal(base_runtime[batch_assets - 1], 10).clip(5).astype(np.int64)
+    order = np.lexsort((batch_start, batch_assets))
+    _insert(conn, 'batches', pd.DataFrame({
+        'asset_id': batch_assets[order],
+        'start_time': _timestamps(batch_start[order]),
+        'end_time': _timestamps((batch_start + runtime.astype('timedelta64[m]'))[order]),
+        'product_name': rng.choice(PRODUCTS, batch_count),
+        'volume_gallons': rng.uniform(200, 500, batch_count).round(2),
+    }))
+
+    # About one alert per asset per day
+    alert_count = asset_count * days
+    alert_assets = rng.integers(1, asset_count + 1, alert_count)
+    thresholds = (base_power[alert_assets - 1] * 1.2).round(2)
+    _insert(conn, 'alerts', pd.DataFrame({
+        'asset_id': alert_assets,
+        'timestamp': _timestamps(np.datetime64(start) + rng.integers(0, days * 86400, alert_count).astype('timedelta64[s]')),
+        'alert_type': rng.choice(ALERT_TYPES, alert_count),
+        'value': (thresholds * rng.uniform(0.9, 1.3, alert_count)).round(2),
+        'threshold': thresholds,
+    }))
+
+    # Monthly bills per site
+    months = pd.date_range(start, periods=max(1, days // 30), freq='MS')
+    bills = pd.MultiIndex.from_product([names, months], names=['site', 'billing_period_start']).to_frame(index=False)
+    bills['billing_period_end'] = (bills['billing_period_start'] + pd.offsets.MonthEnd(0)).dt.strftime('%Y-%m-%d')
+    bills['billing_period_start'] = bills['billing_period_start'].dt.strftime('%Y-%m-%d')
+    bills['total_kwh'] = rng.uniform(9000, 14000, len(bills)).round(0) * assets_per_site
+    bills['peak_kw'] = rng.uniform(250, 350, len(bills)).round(0) * assets_per_site
+    bills['average_kw'] = (bills['total_kwh'] / (30 * 24)).round(1)
+    bills['billing_amount'] = (bills['total_kwh'] * 0.15).round(2)
+    _insert(conn, 'utility_summary', bills)
+
+    conn.commit()
+    conn.close()
+    migrations.migrate(db_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic sustainability database at a chosen scale.')
+    parser.add_argument('db', help='path of the database file to create')
+    parser.add_argument('--sites', type=int, default=3)
+    parser.add_argument('--assets-per-site', type=int, default=10)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval-minutes', type=int, default=1)
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rollups', action='store_true', help='also build the energy rollup tables')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.db, args.sites, args.assets_per_site, args.days, args.interval_minutes, args.start, args.seed)
+    if args.rollups:
+        rollups.refresh(args.db)
+    print(f'Generated {args.db} in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,50 @@
+import os
+import shutil
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import billing
+import data_access
+import shards
+
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    # The bundled database split into one database per site, and the dashboard pointed at them
+    db_path = tmp_path / 'sustainability_data.db'
+    shutil.copy(os.path.join(APP_DIR, 'sustainability_data.db'), db_path)
+    config_path = shards.split(str(db_path), str(tmp_path / 'shards'))
+    monkeypatch.setattr(shards, 'SITE_DBS', shards.load_config(config_path))
+    return config_path
+
+
+def test_split_gives_every_site_its_own_database(sharded):
+    assert len(data_access.databases()) == len(shards.SITE_DBS) > 1
+    for site, db_path in shards.SITE_DBS.items():
+        assert data_access.site_db(site) == db_path
+        # A site that is only billed so far has a shard with no assets
+        sites = data_access.read_sql('SELECT DISTINCT site FROM assets', db_path=db_path)['site'].astype(str)
+        assert set(sites) <= {site}
+
+
+@pytest.mark.parametrize('load', [billing.load_bills, billing.reconcile])
+def test_merged_billing_of_no_sites_is_empty(sharded, load):
+    frame = load([])
+    assert frame.empty
+    assert 'site' in frame.columns
+
+
+def test_billing_page_with_no_sites_selected(sharded, monkeypatch):
+    monkeypatch.chdir(APP_DIR)
+    monkeypatch.setenv('SUSTAINABILITY_WARM_UP', '0')
+    app = AppTest.from_file(os.path.join(APP_DIR, 'main.py'), default_timeout=60)
+    app.session_state.show_authenticate = False
+    app.run()
+    app.sidebar.radio[0].set_value('Billing Info').run()
+    select = next(select for select in app.sidebar.multiselect if select.label == 'Billing Sites')
+    select.set_value([]).run()
+    assert not app.exception, [error.message for error in app.exception]
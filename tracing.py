@@ -0,0 +1,193 @@
+import functools
+import json
+import os
+import threading
+import time
+
+
+# Spans are recorded for a rerun only while a trace is active on its thread: set SUSTAINABILITY_TRACE=1 to trace
+# every rerun, or switch on the sidebar timing panel for one session. With no active trace, span() hands back a
+# shared no-op context manager, so instrumented code pays one thread-local lookup per span
+ALWAYS_ON = os.environ.get('SUSTAINABILITY_TRACE', '') not in ('', '0')
+TRACE_FILE = os.environ.get('SUSTAINABILITY_TRACE_FILE', 'traces.jsonl')
+# Once the trace file passes this size it is rolled over to TRACE_FILE.1, replacing the previous one, so at most
+# twice this much is kept on disk however long traces are left on
+TRACE_FILE_MAX_BYTES = int(float(os.environ.get('SUSTAINABILITY_TRACE_MAX_MB', '50')) * 1024 * 1024)
+METRICS_FILE = os.environ.get('SUSTAINABILITY_METRICS_FILE', 'traces.prom')
+
+KINDS = ('query', 'transform', 'render', 'transmit')
+RERUN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    # Spans of one script rerun: (name, kind, start offset, duration, nested) with times in seconds
+    def __init__(self, view, session_id):
+        self.view = view
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._open_kinds = []
+
+    def totals(self):
+        # Time per kind, counting a span only when it isn't inside another span of the same kind
+        totals = dict.fromkeys(KINDS, 0.0)
+        for _, kind, _, duration, nested in self.spans:
+            if not nested:
+                totals[kind] += duration
+        return totals
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at,
+            'session_id': self.session_id,
+            'view': self.view,
+            'duration_ms': round(self.duration * 1000, 3),
+            'totals_ms': {kind: round(seconds * 1000, 3) for kind, seconds in self.totals().items()},
+            'spans': [{'name': name, 'kind': kind, 'start_ms': round(start * 1000, 3),
+                       'duration_ms': round(duration * 1000, 3)}
+                      for name, kind, start, duration, _ in self.spans],
+        }
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'kind', 'start', 'nested')
+
+    def __init__(self, trace, name, kind):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+
+    def __enter__(self):
+        self.nested = self.kind in self.trace._open_kinds
+        self.trace._open_kinds.append(self.kind)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.trace._open_kinds.remove(self.kind)
+        self.trace.spans.append((self.name, self.kind, self.start - self.trace.origin, end - self.start, self.nested))
+        return False
+
+
+_local = threading.local()
+
+
+def span(name, kind):
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, kind)
+
+
+def traced(kind, name=None):
+    # Decorator form of span() for functions that are one span as a whole
+    def decorate(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start(view=None, session_id=None):
+    _local.trace = Trace(view, session_id)
+    return _local.trace
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+def bind(trace):
+    # Lets worker threads record into the trace of the rerun that started them
+    _local.trace = trace
+
+
+def label(view):
+    trace = current()
+    if trace is not None:
+        trace.view = view
+
+
+_sink_lock = threading.Lock()
+_metrics = {}
+_reruns = {}
+
+
+def finish():
+    trace = current()
+    if trace is None:
+        return None
+    _local.trace = None
+    trace.duration = time.perf_counter() - trace.origin
+    _record(trace)
+    return trace
+
+
+def _record(trace):
+    with _sink_lock:
+        _append_trace(json.dumps(trace.to_dict()) + '\n')
+
+        view = trace.view or 'unknown'
+        for kind, seconds in trace.totals().items():
+            _metrics[view, kind] = _metrics.get((view, kind), 0.0) + seconds
+        counts = _reruns.setdefault(view, [0] * len(RERUN_BUCKETS) + [0, 0.0])
+        for i, bound in enumerate(RERUN_BUCKETS):
+            if trace.duration <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += trace.duration
+        _write_metrics()
+
+
+def _append_trace(line):
+    try:
+        full = os.path.getsize(TRACE_FILE) + len(line) > TRACE_FILE_MAX_BYTES
+    except FileNotFoundError:
+        full = False
+    if full:
+        os.replace(TRACE_FILE, f'{TRACE_FILE}.1')
+    with open(TRACE_FILE, 'a') as out:
+        out.write(line)
+
+
+def _write_metrics():
+    # Prometheus text exposition format, rewritten whole so a scraper or node_exporter textfile collector
+    # only ever sees a complete file
+    lines = ['# HELP sustainability_rerun_seconds Wall time of one dashboard rerun',
+             '# TYPE sustainability_rerun_seconds histogram']
+    for view, counts in sorted(_reruns.items()):
+        for bound, count in zip(RERUN_BUCKETS, counts):
+            lines.append(f'sustainability_rerun_seconds_bucket{{view="{view}",le="{bound}"}} {count}')
+        lines.append(f'sustainability_rerun_seconds_bucket{{view="{view}",le="+Inf"}} {counts[-2]}')
+        lines.append(f'sustainability_rerun_seconds_count{{view="{view}"}} {counts[-2]}')
+        lines.append(f'sustainability_rerun_seconds_sum{{view="{view}"}} {counts[-1]:.6f}')
+
+    lines += ['# HELP sustainability_span_seconds_total Time spent per view and span kind',
+              '# TYPE sustainability_span_seconds_total counter']
+    for (view, kind), seconds in sorted(_metrics.items()):
+        lines.append(f'sustainability_span_seconds_total{{view="{view}",kind="{kind}"}} {seconds:.6f}')
+
+    staging = f'{METRICS_FILE}.tmp'
+    with open(staging, 'w') as out:
+        out.write('\n'.join(lines) + '\n')
+    os.replace(staging, METRICS_FILE)
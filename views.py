@@ -0,0 +1,555 @@
+import pandas as pd
+import streamlit as st
+
+import alert_engine
+import asset_registry
+import billing
+import charts
+import comparison
+import data_access
+import efficiency
+import figures
+import live
+import precompute
+import range_buffer
+import render_cache
+import rollups
+import tracing
+
+
+# Every dashboard view except Home. main imports this module when a session first opens one of them, so the
+# login dialog and the Home page start without altair, matplotlib or seaborn
+
+
+@tracing.traced('query')
+@st.cache_data(ttl=60, show_spinner=False)
+def refresh_rollups():
+    # At most one incremental rollup pass per minute, shared by every session, on every site's database at once
+    return sum(data_access.fan_out(rollups.refresh))
+
+
+@tracing.traced('query')
+@st.cache_data(ttl=60, show_spinner=False)
+def refresh_efficiency():
+    # At most one batch energy attribution pass per minute, shared by every session
+    return sum(data_access.fan_out(efficiency.refresh))
+
+
+@tracing.traced('query')
+@st.cache_data(ttl=60, show_spinner=False)
+def evaluate_alerts():
+    # At most one baseline-deviation evaluation cycle per minute, shared by every session
+    return data_access.fan_out(alert_engine.evaluate)
+
+
+# Options for the sidebar time window, anchored on the newest reading so historical data still shows
+TIME_WINDOWS = {
+    'All time': None,
+    'Last 24 hours': pd.Timedelta(days=1),
+    'Last 7 days': pd.Timedelta(days=7),
+    'Last 30 days': pd.Timedelta(days=30),
+    'Last 365 days': pd.Timedelta(days=365),
+}
+
+# How far one click of the pan buttons moves a zoomed chart, as a fraction of the visible span
+PAN_FRACTION = 0.5
+
+
+def select_time_window():
+    return TIME_WINDOWS[st.sidebar.selectbox('Time Window', tuple(TIME_WINDOWS))]
+
+
+def window_start(window, latest):
+    if window is None or latest is None:
+        return None
+    return latest - window
+
+
+def current_zoom(view_key, window):
+    # The range a view's charts show: its time window, narrowed by the last brush drawn on any of its charts.
+    # A new generation of chart keys after every zoom clears the brush the user just drew
+    zooms = st.session_state.setdefault('zoom', {})
+    zoom = zooms.get(view_key)
+    if zoom is None or zoom['window'] != window:
+        zoom = zooms[view_key] = {'window': window, 'range': window, 'generation': 0}
+
+    prefix = zoom_chart_key(view_key)
+    for key in list(st.session_state.keys()):
+        if isinstance(key, str) and key.startswith(prefix):
+            brushed = charts.brushed_range(st.session_state[key])
+            if brushed is not None:
+                zoom['range'] = brushed
+                zoom['generation'] += 1
+                break
+    return zoom
+
+
+def zoom_chart_key(view_key):
+    return f"{view_key}-{st.session_state.zoom[view_key]['generation']}-"
+
+
+def zoomable(view_key):
+    # Shows the view's zoom controls and returns the key prefix for its charts; None when there is nothing to zoom
+    if view_key not in st.session_state.get('zoom', {}):
+        return None
+    zoom_controls(view_key)
+    return zoom_chart_key(view_key)
+
+
+def pan_zoom(view_key, fraction):
+    zoom = st.session_state.zoom[view_key]
+    (first, last), (start, end) = zoom['window'], zoom['range']
+    shift = (end - start) * fraction
+    shift = max(first - start, min(last - end, shift))
+    zoom['range'] = (start + shift, end + shift)
+    zoom['generation'] += 1
+
+
+def reset_zoom(view_key):
+    zoom = st.session_state.zoom[view_key]
+    zoom['range'] = zoom['window']
+    zoom['generation'] += 1
+
+
+def zoom_controls(view_key):
+    zoom = st.session_state.zoom[view_key]
+    if zoom['range'] == zoom['window']:
+        st.caption("Drag across a chart to zoom into that time range")
+        return
+
+    start, end = zoom['range']
+    st.caption(f"Zoomed to {start:%Y-%m-%d %H:%M} – {end:%Y-%m-%d %H:%M}")
+    earlier, later, reset = st.columns(3)
+    # Panning needs the view's overall bounds; views without them can only zoom and reset
+    if None not in zoom['window']:
+        earlier.button("◀ Earlier", key=f'{view_key}-earlier', on_click=pan_zoom, args=(view_key, -PAN_FRACTION),
+                       disabled=start <= zoom['window'][0], width='stretch')
+        later.button("Later ▶", key=f'{view_key}-later', on_click=pan_zoom, args=(view_key, PAN_FRACTION),
+                     disabled=end >= zoom['window'][1], width='stretch')
+    reset.button("Reset zoom", key=f'{view_key}-reset', on_click=reset_zoom, args=(view_key,),
+                 width='stretch')
+
+
+def fetch_energy(resolution, asset_id, site, start, end):
+    if resolution != 'raw':
+        refresh_rollups()
+        return rollups.load_energy_rollup(resolution, asset_id=asset_id, site=site, start=start, end=end)
+    if asset_id is not None:
+        return data_access.load_energy_usage(asset_id, start=start, end=end)
+    return data_access.load_site_energy_usage(site, start=start, end=end)
+
+
+@tracing.traced('query')
+def load_energy_view(time_window, asset_id=None, site=None, view_key=None):
+    # Serve wide ranges from the coarsest rollup that still fills the chart, narrow ones from raw rows.
+    # With a view_key the range follows the view's zoom and only ranges this session hasn't loaded are fetched.
+    # Returns (frame, resolution, snapshot), snapshot being set when a precomputed site overview was served
+    cover = rollups.coverage(asset_id=asset_id, site=site)
+    first, latest = cover['first'], cover['latest']
+    start = window_start(time_window, latest)
+    if view_key is None or first is None:
+        resolution = rollups.choose_resolution(start if start is not None else first, latest, cover=cover)
+        return fetch_energy(resolution, asset_id, site, start, None), resolution, None
+
+    zoom = current_zoom(view_key, (start if start is not None else first, latest))
+    if site is not None and time_window is None and zoom['range'] == zoom['window']:
+        snapshot = precompute.load_snapshot('energy', site)
+        if snapshot is not None:
+            return snapshot.frame, snapshot.resolution or 'raw', snapshot
+
+    start, end = zoom['range']
+    resolution = rollups.choose_resolution(start, end, cover=cover)
+    buffer = st.session_state.setdefault('range_buffer', range_buffer.RangeBuffer())
+    # Keyed on the database version too, so rows written since (and re-aggregated rollup buckets) are never stale
+    db_path = data_access.asset_db(asset_id) if asset_id is not None else data_access.site_db(site)
+    key = (asset_id, site, resolution, data_access.get_pool(db_path).data_version())
+    energy_data = buffer.load(key, start, end,
+                              lambda lo, hi: fetch_energy(resolution, asset_id, site, lo, hi))
+    return energy_data, resolution, None
+
+
+def show_chart(chart, chart_key, name):
+    # Charts render in the browser from the columnar data; a brush on a keyed chart reruns the script to zoom
+    with tracing.span('altair_chart', 'transmit'):
+        if chart_key is None:
+            st.altair_chart(chart)
+        else:
+            st.altair_chart(chart, key=f'{chart_key}{name}', on_select='rerun', selection_mode=charts.ZOOM_SELECTION)
+
+
+def show_figure(frame, name, draw):
+    # The remaining static matplotlib charts are cached as PNGs keyed on their data, so unchanged ones are never redrawn
+    with tracing.span('cached_png', 'render'):
+        png = render_cache.cached_png(render_cache.data_hash(frame, name), lambda: draw(frame))
+    with tracing.span('image', 'transmit'):
+        st.image(png)
+
+
+def show_freshness(snapshot):
+    # Views served from a precomputed snapshot say how old it is
+    if snapshot is not None:
+        st.caption(f"Precomputed at {snapshot.generated_at:%Y-%m-%d %H:%M:%S} "
+                   f"(database last checked {snapshot.checked_at:%H:%M:%S})")
+
+
+def live_toggle():
+    return st.sidebar.toggle('Live', key='live', help=f"Follow new rows as they arrive, checking every "
+                                                      f"{live.REFRESH_SECONDS}s and redrawing only the charts")
+
+
+@st.fragment(run_every=live.REFRESH_SECONDS)
+def show_live(table, asset_ids, target_asset, selected_site):
+    # Reruns on its own timer without the rest of the page. Each tick reads only the rows past the session's
+    # watermarks into its per-asset ring buffers, so its cost follows the new rows rather than the history.
+    # Ticks skip the admission queue: the full rerun that drew this fragment already holds the session's slot
+    data_access.bind_session(st.session_state.session_id)
+    if table == 'alerts':
+        evaluate_alerts()
+    feed = st.session_state.setdefault('live_feeds', {}).setdefault(table, live.LiveFeed(table))
+    with tracing.span('live_poll', 'query'):
+        new_rows = feed.poll(asset_ids)
+    data = feed.frame(asset_ids)
+    if isinstance(target_asset, list) and not data.empty:
+        registry = asset_registry.load_registry()
+        data['asset_name'] = data['asset_id'].map(registry.name_of)
+        data = data_access.typed(data)
+    st.caption(f"Live: newest {live.BUFFER_ROWS} rows per asset, {new_rows} new at "
+               f"{pd.Timestamp.now():%H:%M:%S}")
+    if table == 'alerts':
+        display_alerts(data, target_asset, selected_site)
+    else:
+        display_energy(data, target_asset, selected_site)
+
+
+# Columns of the billing tables and how to show them
+BILL_COLUMNS = {
+    'site': st.column_config.TextColumn('Site'),
+    'billing_period_start': st.column_config.DateColumn('Period start'),
+    'total_kwh': st.column_config.NumberColumn('kWh', format='%.0f'),
+    'total_kwh_delta': st.column_config.NumberColumn('Δ kWh', format='%+.0f'),
+    'billing_amount': st.column_config.NumberColumn('Amount', format='$%.2f'),
+    'billing_amount_delta': st.column_config.NumberColumn('Δ amount', format='%+.2f'),
+    'cost_per_kwh': st.column_config.NumberColumn('Cost / kWh', format='$%.4f'),
+    'cost_per_kwh_delta': st.column_config.NumberColumn('Δ cost / kWh', format='%+.4f'),
+    'peak_kw': st.column_config.NumberColumn('Peak kW', format='%.0f'),
+    'peak_kw_trend': st.column_config.NumberColumn(f'Peak kW ({billing.PEAK_TREND_PERIODS}-period avg)',
+                                                   format='%.1f'),
+}
+TOTAL_COLUMNS = {
+    'site': st.column_config.TextColumn('Site'),
+    'periods': st.column_config.NumberColumn('Periods'),
+    'total_kwh': st.column_config.NumberColumn('kWh', format='%.0f'),
+    'billing_amount': st.column_config.NumberColumn('Amount', format='$%.2f'),
+    'cost_per_kwh': st.column_config.NumberColumn('Cost / kWh', format='$%.4f'),
+    'max_peak_kw': st.column_config.NumberColumn('Max peak kW', format='%.0f'),
+}
+RECONCILE_COLUMNS = {
+    'site': st.column_config.TextColumn('Site'),
+    'billing_period_start': st.column_config.DateColumn('Period start'),
+    'billed_kwh': st.column_config.NumberColumn('Billed kWh', format='%.0f'),
+    'metered_kwh': st.column_config.NumberColumn('Metered kWh', format='%.0f'),
+    'difference_kwh': st.column_config.NumberColumn('Difference kWh', format='%+.0f'),
+    'difference_pct': st.column_config.NumberColumn('Difference %', format='%+.1f%%'),
+}
+
+
+def select_billing_slice():
+    # Sites and billing periods for the Billing page; (None, None, None) means everything
+    sites = billing.billed_sites()
+    first, last = billing.period_bounds()
+    selected = st.sidebar.multiselect('Billing Sites', sites, default=sites)
+    if first is None:
+        return selected, None, None
+    period = st.sidebar.date_input('Billing Periods', (first.date(), last.date()),
+                                   min_value=first.date(), max_value=last.date())
+    # While a new range is being picked the input holds only its first date
+    start, end = (period if len(period) == 2 else (first.date(), last.date()))
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if set(selected) == set(sites) and start <= first and end >= last:
+        return None, None, None
+    return selected, start, end
+
+
+def display_utility_summary(sites=None, start=None, end=None):
+    st.title('Utility Summary Section')
+    if sites is None and start is None and end is None:
+        st.subheader("The following utility data includes all sites and all billing periods")
+    else:
+        st.subheader("The following utility data covers the selected sites and billing periods")
+
+    # Only the selected slice is loaded, with its analytics computed in SQL; the worker's snapshot covers everything
+    snapshot = None
+    if sites is None and start is None and end is None:
+        snapshot = precompute.load_snapshot('billing')
+    bills = snapshot.frame if snapshot is not None else billing.load_bills(sites, start, end)
+    show_freshness(snapshot)
+    if bills.empty:
+        st.error("❌ No billing data for this selection")
+        return
+
+    show_figure(bills, 'utility_summary', figures.draw_utility_summary)
+
+    st.subheader("Period over Period")
+    st.dataframe(bills[list(BILL_COLUMNS)], hide_index=True, column_config=BILL_COLUMNS)
+
+    st.subheader("Totals by Site")
+    st.dataframe(billing.site_totals(bills), hide_index=True, column_config=TOTAL_COLUMNS)
+
+    # Metered kWh comes from the monthly rollup, brought up to date first
+    st.subheader("Billed vs Metered kWh")
+    refresh_rollups()
+    reconciled = billing.reconcile(sites, start, end)
+    st.dataframe(reconciled[list(RECONCILE_COLUMNS)], hide_index=True, column_config=RECONCILE_COLUMNS)
+
+
+def display_alerts(alert_data, target_asset, selected_site, chart_key=None, snapshot=None):
+    show_freshness(snapshot)
+    if not isinstance(target_asset, list):
+        if len(alert_data) != 0:
+            # Loaders hand back parsed timestamps in time order
+            asset1_data = alert_data
+
+            asset_name = asset_registry.load_registry().name_of(asset1_data['asset_id'].iloc[0])
+
+            for alert_type in asset1_data['alert_type'].unique():
+                st.subheader(f"{alert_type} - {asset_name}")
+                subset = asset1_data[asset1_data['alert_type'] == alert_type]
+
+                show_chart(charts.alert_chart(subset), chart_key, alert_type)
+        else:
+            st.error("❌ No alert data for this asset")
+
+    else:
+        if len(alert_data) != 0:
+            # Site-wide alerts arrive from a single join that already carries asset_name
+            combined_df = alert_data
+
+            for alert_type in combined_df['alert_type'].unique():
+                st.subheader(f"{alert_type} - {selected_site}")
+                subset = combined_df[combined_df['alert_type'] == alert_type]
+
+                show_chart(charts.alert_chart(subset), chart_key, alert_type)
+        else:
+            st.error("❌ No overview data to show")
+
+
+# Per-product efficiency table columns
+PRODUCT_EFFICIENCY_COLUMNS = {
+    'product_name': st.column_config.TextColumn('Product'),
+    'batches': st.column_config.NumberColumn('Batches'),
+    'volume_gallons': st.column_config.NumberColumn('Gallons', format='%.0f'),
+    'energy_kwh': st.column_config.NumberColumn('kWh', format='%.0f'),
+    'kwh_per_gallon': st.column_config.NumberColumn('kWh / gal', format='%.3f'),
+    'best_kwh_per_gallon': st.column_config.NumberColumn('Best batch', format='%.3f'),
+    'worst_kwh_per_gallon': st.column_config.NumberColumn('Worst batch', format='%.3f'),
+}
+
+
+def display_efficiency(efficiency_data):
+    # Energy per gallon from the materialized batch attribution; nothing to show until batches are attributed
+    if efficiency_data is None or len(efficiency_data) == 0:
+        return
+    st.subheader("Energy per Gallon by Product")
+    st.dataframe(efficiency.by_product(efficiency_data), hide_index=True, column_config=PRODUCT_EFFICIENCY_COLUMNS)
+    st.subheader("Energy per Gallon per Batch")
+    show_chart(charts.efficiency_chart(efficiency_data), None, 'efficiency')
+
+
+def display_volume(batch_data, target_asset, selected_site, snapshot=None, efficiency_data=None):
+    show_freshness(snapshot)
+    if not isinstance(target_asset, list):
+        if len(batch_data) != 0:
+            # Batches are loaded in batch_id order
+            asset1_data = batch_data
+
+            # Volume per Batch
+            st.subheader("Volume (Gallons) per Batch")
+            show_figure(asset1_data, 'volume', figures.draw_asset_volume)
+            display_efficiency(efficiency_data)
+
+        else:
+            st.error("❌ No batch data for this asset")
+    else:
+        if len(batch_data) != 0:
+            # Volume Overview per Batch
+            st.subheader("Overview of Volume (Gallons) per Batch")
+            show_figure(batch_data, 'volume_overview', figures.draw_overview_volume)
+            display_efficiency(efficiency_data)
+
+        else:
+            st.error("❌ No overview data to show")
+
+
+def display_energy(energy_data, target_asset, selected_site, chart_key=None, snapshot=None):
+    show_freshness(snapshot)
+    if not isinstance(target_asset, list):
+        if len(energy_data) != 0:
+            # Loaders hand back parsed timestamps in time order
+            asset1_data = energy_data
+
+            for column, label, color in figures.ENERGY_METRICS:
+                st.subheader(f"{label} Over Time")
+                show_chart(charts.series_chart(asset1_data, column, label, color=color), chart_key, column)
+
+        else:
+            st.error("❌ No energy data for this asset")
+    else:
+        if len(energy_data) != 0:
+            # Site-wide readings arrive from a single join, sorted by asset and timestamp
+            for column, label, _ in figures.ENERGY_METRICS:
+                st.subheader(f"Overview of {label} Over Time")
+                show_chart(charts.series_chart(energy_data, column, label, series='asset_name'), chart_key, column)
+
+        else:
+            st.error("❌ No overview data to show")
+
+
+def display_comparison(asset_ids, labels, time_window, column, label, layout):
+    # All assets share one zoomable range, one resolution and one resampling grid
+    cover = comparison.coverage(asset_ids)
+    first, latest = cover['first'], cover['latest']
+    if first is None:
+        st.error("❌ No energy data for the selected assets")
+        return
+
+    view_key = 'comparison'
+    start = window_start(time_window, latest)
+    start, end = current_zoom(view_key, (start if start is not None else first, latest))['range']
+    bins = comparison.grid_size(len(asset_ids))
+    # The rollup has to be at least as fine as the grid, or bins would be left empty
+    resolution = rollups.choose_resolution(start, end, min_points=bins, cover=cover)
+    if resolution != 'raw':
+        refresh_rollups()
+        st.caption(f"Showing {resolution} averages for the selected range")
+
+    with tracing.span('load_series', 'query'):
+        series = comparison.load_series(asset_ids, resolution, start, end)
+    with tracing.span('align', 'transform'):
+        aligned = comparison.align(series, column, start, end, bins)
+        aligned.columns = [labels[asset_id] for asset_id in aligned.columns]
+        long_data = aligned.reset_index().melt(id_vars='timestamp', var_name='asset', value_name=column)
+
+    chart_key = zoomable(view_key)
+    st.subheader(f"{label} Over Time")
+    if layout == 'Overlaid':
+        show_chart(charts.series_chart(long_data, column, label, series='asset'), chart_key, column)
+    else:
+        show_chart(charts.small_multiples(long_data, column, label, series='asset'), chart_key, column)
+
+
+def show_view(dashboard_option, registry, selected_site, selected_asset, target_asset):
+    # Nav bar choices: display different data depending on which view is selected
+    match dashboard_option:
+
+        # Energy page: shows energy consumption (overview or by specific asset) for a given site
+        case 'Energy':
+            st.subheader("Energy Section", divider="gray")
+            if live_toggle():
+                if target_asset is not None:
+                    st.subheader(f"The following data is for {selected_site}: {selected_asset}")
+                    show_live('energy_usage', [target_asset], target_asset, selected_site)
+                else:
+                    st.subheader(f"The following data is an overview of the {selected_site} location")
+                    asset_ids = list(registry.site_assets(selected_site))
+                    show_live('energy_usage', asset_ids, asset_ids, selected_site)
+                return
+            time_window = select_time_window()
+
+            # If specific asset is chosen, display energy data for that asset
+            if target_asset is not None:
+                st.subheader(f"The following data is for {selected_site}: {selected_asset}")
+                view_key = f'energy-asset-{target_asset}'
+                energy_data, resolution, snapshot = load_energy_view(time_window, asset_id=target_asset,
+                                                                    view_key=view_key)
+
+            # Otherwise, show overview energy data for the chosen site
+            else:
+                st.subheader(f"The following data is an overview of the {selected_site} location")
+                view_key = f'energy-site-{selected_site}'
+                energy_data, resolution, snapshot = load_energy_view(time_window, site=selected_site,
+                                                                    view_key=view_key)
+                target_asset = list(registry.site_assets(selected_site))
+
+            if resolution != 'raw':
+                st.caption(f"Showing {resolution} averages for the selected range")
+
+            display_energy(energy_data, target_asset, selected_site, zoomable(view_key), snapshot)
+
+        # Volume page:
+        case 'Volume':
+            st.subheader("Volume Section", divider="gray")
+            snapshot = None
+            refresh_efficiency()
+            if target_asset is not None:
+                batch_data = data_access.load_batches(target_asset)
+                efficiency_data = efficiency.load_batch_efficiency(asset_id=target_asset)
+            else:
+                efficiency_data = efficiency.load_batch_efficiency(site=selected_site)
+                snapshot = precompute.load_snapshot('volume', selected_site)
+                if snapshot is not None:
+                    batch_data = snapshot.frame
+                else:
+                    batch_data = data_access.load_site_batches(selected_site)
+                target_asset = list(registry.site_assets(selected_site))
+
+            display_volume(batch_data, target_asset, selected_site, snapshot, efficiency_data)
+
+        # Alerts page:
+        case 'Alerts':
+            st.subheader("Alerts Section", divider="gray")
+            if live_toggle():
+                if target_asset is not None:
+                    st.subheader(f"The following alert data is for {selected_site}: {selected_asset}")
+                    show_live('alerts', [target_asset], target_asset, selected_site)
+                else:
+                    st.subheader(f"The following alert data is an overview of the {selected_site} location")
+                    asset_ids = list(registry.site_assets(selected_site))
+                    show_live('alerts', asset_ids, asset_ids, selected_site)
+                return
+            evaluate_alerts()
+            # Alerts load for the whole history until a brush narrows the range
+            view_key = f'alerts-{target_asset if target_asset is not None else selected_site}'
+            start, end = current_zoom(view_key, (None, None))['range']
+            snapshot = None
+            if target_asset is not None:
+                st.subheader(f"The following alert data is for {selected_site}: {selected_asset}")
+                alert_data = data_access.load_alerts(target_asset, start, end)
+            else:
+                st.subheader(f"The following alert data is an overview of the {selected_site} location")
+                # The precomputed snapshot covers the whole history, so it stands in only until a zoom
+                if start is None and end is None:
+                    snapshot = precompute.load_snapshot('alerts', selected_site)
+                if snapshot is not None:
+                    alert_data = snapshot.frame
+                else:
+                    alert_data = data_access.load_site_alerts(selected_site, start, end)
+                target_asset = list(registry.site_assets(selected_site))
+
+            display_alerts(alert_data, target_asset, selected_site, zoomable(view_key), snapshot)
+
+        # Billing page:
+        case 'Billing Info':
+            st.subheader("Billing Section", divider="gray")
+            display_utility_summary(*select_billing_slice())
+
+        # Comparison page: compare any number of assets (same or different sites) on one time grid
+        case 'Comparison':
+            st.subheader("Comparison Section", divider="gray")
+            time_window = select_time_window()
+
+            # Any asset from any site; starts from the selected asset, or the site's first two on 'Overview'
+            labels = {asset_id: f"{site}: {registry.name_of(asset_id)}"
+                      for site, asset_ids in registry.sites.items() for asset_id in asset_ids}
+            default = ([target_asset] if target_asset is not None
+                       else list(registry.site_assets(selected_site))[:2])
+            compared = st.sidebar.multiselect('Compare Assets', tuple(labels), default=default,
+                                              format_func=labels.get,
+                                              max_selections=comparison.MAX_COMPARED_ASSETS)
+            column, label, _ = figures.ENERGY_METRICS[st.sidebar.selectbox(
+                'Metric', range(len(figures.ENERGY_METRICS)), format_func=lambda i: figures.ENERGY_METRICS[i][1])]
+            layout = st.sidebar.radio('Layout', ('Overlaid', 'Small multiples'))
+
+            if len(compared) < 2:
+                st.subheader("Please select at least two assets to compare")
+            else:
+                display_comparison(compared, labels, time_window, column, label, layout)